@@ -0,0 +1,34 @@
+"""Benchmarks the damage falloff of the sonar map, which should not grow with the blast radius or the map size.
+
+Run with `python benchmarks/sonar_damage.py` from the server directory.
+"""
+
+import timeit
+
+from sonar_placement import build_map
+
+from serenity.common.definitions import Owner
+from serenity.sonar.definitions import Torpedo
+
+SIZES = [15, 50, 200]
+RADII = [1, 4, 16]
+REPEATS = 2000
+
+
+def main() -> None:
+    for size in SIZES:
+        map_ = build_map(size)
+        target = map_._ship_positions[Owner.NPCS]  # pylint: disable=protected-access
+
+        for radius in RADII:
+            # Without damage the ships are only repaired, so the blast can be repeated
+            torpedo = Torpedo(owner=Owner.PLAYERS, damage=0, reach=radius, radius=radius)
+            seconds = timeit.timeit(
+                lambda: map_._apply_damage_with_falloff(torpedo, target),  # pylint: disable=protected-access
+                number=REPEATS,
+            )
+            print(f"{size:>4}x{size:<4} radius {radius:<3} {seconds / REPEATS * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
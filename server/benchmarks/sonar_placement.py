@@ -0,0 +1,96 @@
+"""Benchmarks launch validation and move listing of the sonar map.
+
+Both must answer without copying any actor or cell, every copy made while they run fails the benchmark.
+
+Run with `python benchmarks/sonar_placement.py` from the server directory.
+"""
+
+import copy
+import random
+import timeit
+from typing import Callable, Dict
+
+from serenity.common.definitions import Owner
+from serenity.sonar.definitions import CellModel, GridPosition, MapModel, Mine, Ship, Torpedo
+from serenity.sonar import logic
+from serenity.sonar.logic import Map
+
+SIZES = [15, 50, 200]
+REPEATS = 2000
+
+
+def build_map(size: int, seed: int = 0) -> Map:
+    rnd = random.Random(seed)
+    grid = [[CellModel(content=set(), has_asteroid=rnd.random() < 0.15) for _ in range(size)] for _ in range(size)]
+    center = size // 2
+    for x, y in [(center, center), (center + 1, center)]:
+        grid[y][x] = CellModel(content=set(), has_asteroid=False)
+
+    return Map(
+        MapModel(
+            width=size,
+            height=size,
+            grid=grid,
+            player_ship=Ship(name="Serenity", total_hp=3, owner=Owner.PLAYERS),
+            npc_ship=Ship(name="Reaver", total_hp=3, owner=Owner.NPCS),
+            ship_positions={Owner.PLAYERS: GridPosition(center, center), Owner.NPCS: GridPosition(center + 1, center)},
+            mine_positions={},
+        )
+    )
+
+
+def count_copies(function: Callable[[], object]) -> int:
+    """Counts the copies made by `function`.
+
+    Both the `copy` module and the names the sonar logic imported from it are patched, as a
+    `from copy import deepcopy` would not see a patched module.
+    """
+    copies = 0
+    targets = [
+        (module, name)
+        for module in (copy, logic)
+        for name in ("copy", "deepcopy")
+        if getattr(module, name, None) in (copy.copy, copy.deepcopy)
+    ]
+    originals = {target: getattr(*target) for target in targets}
+
+    def counting(original: Callable) -> Callable:
+        def wrapper(*args: object, **kwargs: object) -> object:
+            nonlocal copies
+            copies += 1
+            return original(*args, **kwargs)
+
+        return wrapper
+
+    for (module, name), original in originals.items():
+        setattr(module, name, counting(original))
+    try:
+        function()
+    finally:
+        for (module, name), original in originals.items():
+            setattr(module, name, original)
+
+    return copies
+
+
+def main() -> None:
+    torpedo = Torpedo(owner=Owner.PLAYERS, damage=3, reach=4, radius=2)
+    mine = Mine(owner=Owner.PLAYERS, damage=3, reach=4, radius=2)
+
+    for size in SIZES:
+        map_ = build_map(size)
+        operations: Dict[str, Callable[[], object]] = {
+            "torpedo launch": lambda: map_.possible_object_launch(torpedo),
+            "mine placement": lambda: map_.possible_object_launch(mine),
+            "moves": lambda: map_.available_moves_for_ship(Owner.PLAYERS),
+        }
+
+        for name, operation in operations.items():
+            copies = count_copies(operation)
+            assert copies == 0, f"{name} made {copies} copies on a {size}x{size} map"
+            seconds = timeit.timeit(operation, number=REPEATS) / REPEATS
+            print(f"{size:>4}x{size:<4} {name:<16} {seconds * 1e6:8.1f} us  0 copies")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Soak test of the websocket registry: connects and disconnects many websockets while broadcasting.
+
+Fails if a disconnected websocket is left in any index of the manager, or if memory grows with the
+number of connections made.
+
+Run with `python benchmarks/websocket_soak.py` from the server directory.
+"""
+
+import asyncio
+import gc
+import os
+import tracemalloc
+
+os.environ.setdefault("SERENITY_BUS_BACKEND", "memory")
+
+# pylint: disable=wrong-import-position,protected-access
+from serenity.api.websockets_manager import WebsocketsManager
+from serenity.common.definitions import MessageType, RedisMessage, ServiceType, Topic
+from serenity.travel.nx_to_flow_adapter import NxToFlowAdapter
+
+WARMUP_CYCLES = 500
+CYCLES = 5000
+MAX_GROWTH_BYTES = 64 * 1024
+
+
+class SilentWebsocket:
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, data: str) -> None:
+        pass
+
+    async def send_bytes(self, data: bytes) -> None:
+        pass
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+async def run_cycles(manager: WebsocketsManager, cycles: int) -> None:
+    message = RedisMessage(topic=Topic.BROADCAST_STATUS, type=MessageType.DAMAGE, concerns=ServiceType.SONAR, data={})
+
+    for index in range(cycles):
+        websocket = SilentWebsocket()
+        await manager.subscribe_to_broadcast(
+            websocket, {Topic.BROADCAST_STATUS}, services={ServiceType.SONAR} if index % 2 else None
+        )
+        await manager.add_adapter(websocket, Topic.BROADCAST_STATUS, NxToFlowAdapter)
+        await manager.broadcast(message)
+        await asyncio.sleep(0)
+        await manager._disconnect(websocket)
+
+    await asyncio.sleep(0.01)
+    gc.collect()
+
+
+async def main() -> None:
+    manager = WebsocketsManager()
+    await run_cycles(manager, WARMUP_CYCLES)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    await run_cycles(manager, CYCLES)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    growth = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    print(f"{CYCLES} connections, memory growth {growth / 1024:.1f} KiB")
+
+    assert not manager._connections, f"{len(manager._connections)} connections left"
+    assert not manager._active_connections, f"topics left in the index: {list(manager._active_connections)}"
+    assert not manager._routes, f"routes left in the index: {list(manager._routes)}"
+    assert growth < MAX_GROWTH_BYTES, f"memory grew by {growth} bytes"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
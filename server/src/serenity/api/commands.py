@@ -0,0 +1,84 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from serenity.common.definitions import Direction, MessageType, Owner, Topic
+from serenity.common.redis_client import RedisMessage
+from serenity.sonar.definitions import Battle, Damage, GridPosition
+
+
+class Move(BaseModel):
+    owner: Owner
+    direction: Direction
+
+
+class Launch(BaseModel):
+    owner: Owner
+    target: GridPosition
+
+
+class Detonation(BaseModel):
+    mine_uid: str
+
+
+class Repair(BaseModel):
+    owner: Owner
+    hp: int
+
+
+# Shape of the data of each command handled by the services, None when the data is ignored
+COMMAND_DATA: Dict[MessageType, Optional[TypeAdapter]] = {
+    MessageType.TAKEOFF: TypeAdapter(str),
+    MessageType.PAUSE_TRAVEL: None,
+    MessageType.RESUME_TRAVEL: None,
+    MessageType.START_BATTLE: TypeAdapter(Battle),
+    MessageType.END_BATTLE: None,
+    MessageType.MOVE: TypeAdapter(Move),
+    MessageType.LAUNCH_TORPEDO: TypeAdapter(Launch),
+    MessageType.LAUNCH_MINE: TypeAdapter(Launch),
+    MessageType.DETONATE_MINE: TypeAdapter(Detonation),
+    MessageType.REPAIR: TypeAdapter(Repair),
+    MessageType.DIRECT_DAMAGE: TypeAdapter(Damage),
+    MessageType.SURFACE: None,
+}
+
+
+class Command(BaseModel):
+    type: MessageType
+    data: Optional[Any] = None
+
+
+class CommandResult(BaseModel):
+    type: MessageType
+    valid: bool
+    published: bool = False
+    error: Optional[str] = None
+
+
+def validate_command(command: Command) -> Optional[str]:
+    """Returns why the command would be rejected by the services, or None if it is valid."""
+    if command.type not in COMMAND_DATA:
+        return f"{command.type.value} is not a command."
+
+    data_type = COMMAND_DATA[command.type]
+    if data_type is None:
+        return None
+
+    try:
+        data_type.validate_python(command.data)
+    except ValidationError as err:
+        return str(err)
+
+    return None
+
+
+def to_message(command: Command) -> RedisMessage:
+    return RedisMessage(topic=Topic.COMMAND, type=command.type, data=command.data)
+
+
+def validate_all(commands: List[Command]) -> List[CommandResult]:
+    results = []
+    for command in commands:
+        error = validate_command(command)
+        results.append(CommandResult(type=command.type, valid=error is None, error=error))
+    return results
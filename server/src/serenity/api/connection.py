@@ -0,0 +1,50 @@
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from fastapi import WebSocket
+
+from serenity.api.encodings import Encoding
+from serenity.api.websocket_sender import WebsocketSender
+from serenity.common.adapter import Adapter
+from serenity.common.definitions import MessageType, ServiceType, Topic
+
+
+@dataclass(eq=False)
+class Connection:
+    """Everything known about a subscribed websocket, dropped at once when it disconnects."""
+
+    websocket: WebSocket
+    sender: WebsocketSender
+    topics: Set[Topic]
+    services: Optional[Set[ServiceType]] = None  # None for all of them
+    types: Optional[Set[MessageType]] = None  # None for all of them
+    encoding: Encoding = Encoding.JSON
+    deltas: bool = False
+    heartbeat: bool = False
+    adapters: Dict[Topic, List[Adapter]] = field(default_factory=lambda: defaultdict(list))
+    connected_at: float = field(default_factory=time.monotonic)
+    last_seen: float = field(default_factory=time.monotonic)
+    ping: Optional[Tuple[int, float]] = None  # id and send time of the unanswered heartbeat
+
+    @property
+    def idle_seconds(self) -> float:
+        return time.monotonic() - self.last_seen
+
+    def route_keys(self) -> Iterator[Tuple[Topic, Optional[ServiceType]]]:
+        """Keys of the routing index the websocket is listed under."""
+        for topic in self.topics:
+            for service in self.services or {None}:
+                yield topic, service
+
+    def wants(self, message_type: MessageType) -> bool:
+        """Asking for `STATE` also covers `STATE_DELTA`."""
+        if self.types is None:
+            return True
+        if message_type == MessageType.STATE_DELTA:
+            message_type = MessageType.STATE
+        return message_type in self.types
+
+    def adapter_chain(self, topic: Topic) -> Tuple[Adapter, ...]:
+        return tuple(self.adapters.get(topic, ()))
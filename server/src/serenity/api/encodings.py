@@ -0,0 +1,49 @@
+import zlib
+from enum import Enum
+
+import orjson
+
+from serenity.common.config import settings
+from serenity.common.definitions import Jsonable
+from serenity.common.metrics import websocket_encode_seconds, websocket_payload_bytes
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+Payload = str | bytes
+
+
+class Encoding(str, Enum):
+    """How a websocket wants its messages encoded.
+
+    `json` is sent as text frames, the others as binary frames.
+    """
+
+    JSON = "json"
+    DEFLATE = "deflate"  # zlib compressed JSON
+    MSGPACK = "msgpack"  # needs the msgpack package, a dependency of the server
+
+    @property
+    def is_available(self) -> bool:
+        return self != Encoding.MSGPACK or msgpack is not None
+
+
+def encode(data: Jsonable, encoding: Encoding) -> Payload:
+    """Encodes a JSON-compatible message, recording its size and encoding time."""
+    with websocket_encode_seconds.time(encoding=encoding.value):
+        match encoding:
+            case Encoding.JSON:
+                encoded = orjson.dumps(data)  # pylint: disable=maybe-no-member
+                payload = encoded.decode()
+            case Encoding.DEFLATE:
+                encoded = payload = zlib.compress(
+                    orjson.dumps(data), settings.websocket_deflate_level  # pylint: disable=maybe-no-member
+                )
+            case Encoding.MSGPACK:
+                encoded = payload = msgpack.packb(data)
+
+    # Text payloads are measured as the UTF-8 bytes sent on the wire, not as characters
+    websocket_payload_bytes.observe(len(encoded), encoding=encoding.value)
+    return payload
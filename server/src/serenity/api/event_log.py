@@ -0,0 +1,113 @@
+import asyncio
+import os
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from serenity.api.encodings import Encoding, encode
+from serenity.common.adapter import Adapter
+from serenity.common.config import settings
+from serenity.common.definitions import MessageType, ServiceType
+from serenity.common.redis_client import RedisMessage
+
+
+class Event:
+    """A full status message with its position in the log, encoded on first use."""
+
+    def __init__(self, number: int, message: RedisMessage, adapters: Tuple[Adapter, ...]) -> None:
+        self.number = number
+        self.message = message
+        self._adapters = adapters
+        self._data: Optional[str] = None
+
+    @property
+    def data(self) -> str:
+        if self._data is None:
+            message = self.message
+            for adapter in self._adapters:
+                message = adapter.adapt_if_needed(message)
+            self._data = encode(message.model_dump(mode="json"), Encoding.JSON)
+        return self._data
+
+
+class EventLog:
+    """Bounded log of the broadcasted statuses, for clients resuming a stream where they left it.
+
+    Event ids are prefixed with an id of the process, so ids from a previous run are never
+    mistaken for current ones.
+    """
+
+    def __init__(self, adapters: Tuple[Adapter, ...] = ()) -> None:
+        self._adapters = adapters
+        self._boot_id = os.urandom(4).hex()
+        self._events: Deque[Event] = deque(maxlen=settings.sse_buffer_size)
+        self._latest: Dict[Tuple[MessageType, ServiceType], Event] = {}
+        self._last_number = 0
+        self._appended = asyncio.Condition()
+
+    async def append(self, message: RedisMessage) -> None:
+        """Adds a full message, deltas must be resolved by the caller."""
+        self._last_number += 1
+        event = Event(self._last_number, message, self._adapters)
+        self._events.append(event)
+
+        if message.type in (MessageType.STATE, MessageType.CONFIG):
+            self._latest[(message.type, message.concerns)] = event
+
+        async with self._appended:
+            self._appended.notify_all()
+
+    def _missed_since(self, event_id: Optional[str]) -> Optional[List[Event]]:
+        """Events after `event_id`, or None if they are not all in the log anymore."""
+        if event_id is None:
+            return None
+
+        boot_id, _, number = event_id.rpartition("-")
+        if boot_id != self._boot_id or not number.isdigit() or int(number) > self._last_number:
+            return None
+
+        oldest = self._events[0].number if self._events else self._last_number + 1
+        if int(number) < oldest - 1:
+            return None
+
+        return [event for event in self._events if event.number > int(number)]
+
+    def _snapshot(self) -> List[Event]:
+        return sorted(self._latest.values(), key=lambda event: event.number)
+
+    async def stream(
+        self, last_event_id: Optional[str], services: Optional[Set[ServiceType]] = None
+    ) -> AsyncIterator[Optional[Tuple[str, str]]]:
+        """Ids and data of the events missed since `last_event_id`, then of the new ones as they come.
+
+        Falls back to the latest state and config of each service when the missed events are not
+        all in the log anymore, for new clients or ones that fell too far behind. None is yielded
+        when nothing happened for `sse_keepalive_seconds`.
+        """
+        events = self._missed_since(last_event_id)
+        is_snapshot = events is None
+        if is_snapshot:
+            events = self._snapshot()
+        sent = self._last_number
+
+        while True:
+            for event in events:
+                if services is None or event.message.concerns is None or event.message.concerns in services:
+                    # Snapshot events are older than the ones they stand for, their id must tell how far the client is
+                    number = sent if is_snapshot else event.number
+                    yield f"{self._boot_id}-{number}", event.data
+
+            try:
+                async with self._appended:
+                    await asyncio.wait_for(
+                        self._appended.wait_for(lambda: self._last_number > sent), settings.sse_keepalive_seconds
+                    )
+            except asyncio.TimeoutError:
+                events = []
+                yield None
+                continue
+
+            events = [event for event in self._events if event.number > sent]
+            is_snapshot = not events or events[0].number > sent + 1
+            if is_snapshot:
+                events = self._snapshot()
+            sent = self._last_number
@@ -1,19 +1,26 @@
-from typing import Dict, Optional, Type
+from typing import Callable, Dict, List, Optional, Type
 import asyncio
 from datetime import datetime
 import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.websockets import WebSocket
 import orjson
 from pydantic import Json
 from pydantic.utils import deep_update
+from serenity.api.commands import Command, CommandResult, to_message, validate_all
+from serenity.api.encodings import Encoding
+from serenity.api.event_log import EventLog
+from serenity.api.service_ownership import ServiceOwnership
 from serenity.api.websockets_manager import WebsocketsManager
 from serenity.common.config import settings
 from serenity.common.definitions import Jsonable, MessageType, Owner, ServiceType, StatusBaseModel, Topic
+from serenity.common.metrics import registry
 from serenity.common.redis_client import RedisClient, RedisMessage
-from serenity.common.service import Service
+from serenity.common.service import Service, ServiceStopped
+from serenity.common.versioning import resync_request
 from serenity.light.light_service import LightService
 from serenity.sonar.sonar_service import SonarService
 from serenity.sound.sound_service import SoundService
@@ -33,8 +40,10 @@ app.add_middleware(
     allow_origins=settings.cors_origins,
 )
 
-websockets_manager = WebsocketsManager()
+event_log = EventLog(adapters=(NxToFlowAdapter,))
+websockets_manager = WebsocketsManager(event_log)
 redis = RedisClient()
+ownership = ServiceOwnership(redis)
 
 services_dict: Dict[Topic, Type[Service]] = {
     ServiceType.TRAVEL: TravelService,
@@ -43,7 +52,11 @@ services_dict: Dict[Topic, Type[Service]] = {
     ServiceType.LIGHT: LightService,
     ServiceType.SOUND: SoundService,
 }
+# Only filled in the process owning the services, see `ServiceOwnership`
 services: Dict[Topic, Service] = {}
+service_tasks: List[asyncio.Task] = []
+# Long running tasks of the process, referenced so they are not garbage collected
+background_tasks: List[asyncio.Task] = []
 
 
 async def init_services(service: Service) -> None:
@@ -55,70 +68,204 @@ async def init_services(service: Service) -> None:
             services[key] = service.default_service()
 
 
-@app.on_event("startup")
-async def startup_event() -> None:
+async def start_services() -> None:
     await redis.release_all_locks()
 
     await init_services(services)
 
     for service in services.values():
-        asyncio.create_task(service.start())
+        service_tasks.append(asyncio.create_task(service.start()))
+
+
+async def stop_services() -> None:
+    """Another process runs the services now, the local ones must stop without persisting anything."""
+    for task in service_tasks:
+        task.cancel()
+    await asyncio.gather(*service_tasks, return_exceptions=True)
+    for service in services.values():
+        service.abandon()
+    service_tasks.clear()
+    services.clear()
+    Service.persister.discard()
+
+
+@app.exception_handler(ServiceStopped)
+async def service_stopped_handler(request: Request, err: ServiceStopped) -> Response:
+    """The services were handed over to another process while the request was waiting for them."""
+    return Response(status_code=503, headers={"Retry-After": "1"})
 
+
+@app.on_event("startup")
+async def startup_event() -> None:
     for topic in Topic:
         if topic != Topic.BROADCAST_STATUS:
             continue
-        asyncio.create_task(websockets_manager.broadcast_loop(topic))
+        background_tasks.append(asyncio.create_task(websockets_manager.broadcast_loop(topic)))
+    background_tasks.append(asyncio.create_task(websockets_manager.heartbeat_loop()))
+
+    background_tasks.append(asyncio.create_task(ownership.run(start_services, stop_services)))
+    for task in background_tasks:
+        task.add_done_callback(_log_task_failure)
+
+
+def _log_task_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logging.error("Background task %s failed: %s", task.get_name(), task.exception())
 
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
     await websockets_manager.disconnect_all()
-    await redis.release_all_locks()
+    if ownership.is_owner:
+        await Service.persister.close()
+        await redis.release_all_locks()
+        await ownership.release()
     await redis.terminate_all_channels()
 
 
 @app.websocket("/dashboard")
-async def dashboard(websocket: WebSocket) -> None:
-    await websockets_manager.subscribe_to_broadcast(websocket, {Topic.BROADCAST_STATUS})
+async def dashboard(
+    websocket: WebSocket,
+    deltas: bool = False,
+    services: Optional[List[ServiceType]] = Query(None),
+    types: Optional[List[MessageType]] = Query(None),
+    encoding: Encoding = Encoding.JSON,
+    heartbeat: bool = False,
+) -> None:
+    """Status updates for the dashboards, e.g. `/dashboard?services=travel&types=state&types=config`."""
+    if not encoding.is_available:
+        await websocket.close(code=1003, reason=f"Encoding {encoding.value} is not available.")
+        return
+
+    await websockets_manager.subscribe_to_broadcast(
+        websocket,
+        {Topic.BROADCAST_STATUS},
+        deltas=deltas,
+        services=set(services) if services else None,
+        types=set(types) if types else None,
+        encoding=encoding,
+        heartbeat=heartbeat,
+    )
     await websockets_manager.add_adapter(websocket, Topic.BROADCAST_STATUS, NxToFlowAdapter)
-
-    await services[ServiceType.TRAVEL].broadcast_status()
-    await services[ServiceType.SONAR].broadcast_status()
+    await websockets_manager.send_snapshot(websocket, Topic.BROADCAST_STATUS, {ServiceType.TRAVEL, ServiceType.SONAR})
 
     await websockets_manager.forward_socket_messages(websocket)
 
 
+@app.get("/dashboard/events")
+async def dashboard_events(
+    services: Optional[List[ServiceType]] = Query(None),
+    last_event_id: Optional[str] = Header(None),
+) -> StreamingResponse:
+    """Status updates as server-sent events, for screens that cannot keep a websocket open.
+
+    Reconnecting browsers send the `Last-Event-ID` header and only receive what they missed.
+    """
+
+    async def events():
+        async for event in event_log.stream(last_event_id, set(services) if services else None):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                event_id, data = event
+                yield f"id: {event_id}\ndata: {data}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 # @app.websocket("/sound")
 # async def sound(websocket: WebSocket) -> None:
 #     await websockets_manager.subscribe_to_broadcast(websocket, {Topic.SOUND})
 
 
+@app.get("/metrics")
+async def metrics() -> Response:
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4")
+
+
+def _conditional_response(etag: str, if_none_match: Optional[str], content: Callable[[], bytes]) -> Response:
+    """Answers 304 when the client already has `etag`, without building the content."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if if_none_match is not None:
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in candidates or "*" in candidates:
+            return Response(status_code=304, headers=headers)
+
+    return Response(content=content(), media_type="application/json", headers=headers)
+
+
+async def _remote_status_response(
+    service_type: ServiceType, message_type: MessageType, if_none_match: Optional[str]
+) -> Response:
+    """Status of a service running in another process, as last broadcasted."""
+    status = websockets_manager.latest_status(Topic.BROADCAST_STATUS, message_type, service_type)
+    if status is None:
+        await redis.publish(resync_request(service_type))
+        return Response(status_code=503, headers={"Retry-After": "1"})
+
+    etag, data = status
+    return _conditional_response(etag, if_none_match, lambda: data)
+
+
+async def _propose_remote_status(service_type: ServiceType, message_type: MessageType, update: Jsonable) -> None:
+    """Merges an update into the last broadcasted status and proposes it to the service owner."""
+    status = websockets_manager.latest_status(Topic.BROADCAST_STATUS, message_type, service_type)
+    if status is None:
+        await redis.publish(resync_request(service_type))
+        raise HTTPException(status_code=503, detail=f"Status of {service_type.value} not received yet.")
+
+    service_class = services_dict[service_type]
+    model = service_class.state_type if message_type == MessageType.STATE else service_class.config_type
+    new_status = model(**deep_update(orjson.loads(status[1]), update))  # pylint: disable=maybe-no-member
+
+    await redis.publish(
+        RedisMessage(topic=Topic.PROPOSE_STATUS, type=message_type, concerns=service_type, data=new_status)
+    )
+
+
 @app.get("/state/{service_type}")
-async def get_state(service_type: ServiceType) -> Jsonable:
-    async with services[service_type].get_self_lock():
-        return services[service_type].to_state().model_dump(mode="json")
+async def get_state(service_type: ServiceType, if_none_match: Optional[str] = Header(None)) -> Response:
+    if service_type not in services:
+        return await _remote_status_response(service_type, MessageType.STATE, if_none_match)
+
+    service = services[service_type]
+    snapshot = service.state_snapshot()
+    return _conditional_response(snapshot.etag, if_none_match, lambda: snapshot.json)
 
 
 @app.post("/state/{service_type}")
 async def set_state(service_type: ServiceType, state: Jsonable) -> None:
+    if service_type not in services:
+        await _propose_remote_status(service_type, MessageType.STATE, state)
+        return
+
     service = services[service_type]
-    curr_state = service.to_state().model_dump(mode="json")
+    curr_state = service.state_snapshot().dict
     new_state = service.state_type(**deep_update(curr_state, state))
     await service.update_state(new_state)
 
 
 @app.get("/config/{service_type}")
-async def get_config(service_type: ServiceType) -> Jsonable:
-    async with services[service_type].get_self_lock():
-        return services[service_type].to_config().model_dump()
+async def get_config(service_type: ServiceType, if_none_match: Optional[str] = Header(None)) -> Response:
+    if service_type not in services:
+        return await _remote_status_response(service_type, MessageType.CONFIG, if_none_match)
+
+    service = services[service_type]
+    snapshot = service.config_snapshot()
+    return _conditional_response(snapshot.etag, if_none_match, lambda: snapshot.json)
 
 
 @app.post("/config/{service_type}")
 async def set_config(service_type: ServiceType, config: Jsonable) -> None:
+    if service_type not in services:
+        await _propose_remote_status(service_type, MessageType.CONFIG, config)
+        return
+
     service = services[service_type]
-    curr_config = service.to_config().model_dump()
+    curr_config = service.config_snapshot().dict
     new_config = service.config_type(**deep_update(curr_config, config))
-    service.update_config(new_config)
+    await service.update_config(new_config)
 
 
 @app.post("/start_battle")
@@ -143,6 +290,26 @@ async def command(command: MessageType, data: Optional[dict] = None) -> None:
     )
 
 
+@app.post("/commands", response_model=List[CommandResult])
+async def batch_commands(commands: List[Command]) -> JSONResponse:
+    """Publishes a sequence of commands in order and in a single round trip.
+
+    Nothing is published if any command is invalid, the results then tell which ones are.
+    """
+    results = validate_all(commands)
+
+    if not all(result.valid for result in results):
+        return JSONResponse(status_code=422, content=[result.model_dump(mode="json") for result in results])
+
+    async with redis.batch() as batch:
+        for command in commands:
+            batch.publish(to_message(command))
+
+    for result in results:
+        result.published = True
+    return JSONResponse(content=[result.model_dump(mode="json") for result in results])
+
+
 @app.get("/repair/{owner}/{hp}")
 async def repair(owner: Owner, hp: int) -> None:
     await redis.publish(
@@ -159,15 +326,16 @@ async def repair(owner: Owner, hp: int) -> None:
 
 @app.get("/pause_travel")
 async def pause_travel() -> None:
-    await services[ServiceType.TRAVEL].pause()
+    await redis.publish(RedisMessage(topic=Topic.COMMAND, type=MessageType.PAUSE_TRAVEL))
 
 
 @app.get("/resume_travel")
 async def resume_travel() -> None:
-    await services[ServiceType.TRAVEL].resume()
+    await redis.publish(RedisMessage(topic=Topic.COMMAND, type=MessageType.RESUME_TRAVEL))
 
 
 @app.get("/broadcast_all")
 async def broadcast_all() -> None:
-    for service in services.values():
-        await service.broadcast_status()
+    async with redis.batch() as batch:
+        for service_type in services_dict:
+            batch.publish(resync_request(service_type))
@@ -0,0 +1,32 @@
+import argparse
+
+import uvicorn
+
+from serenity.common.config import settings
+
+
+def main() -> None:
+    """Runs the API with protocol level pings on the websockets.
+
+    Browsers answer those pings on their own, so dashboards that went away without closing their
+    websocket are disconnected without any support from the client.
+    """
+    parser = argparse.ArgumentParser(description="Serves the serenity API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--reload", action="store_true")
+    args = parser.parse_args()
+
+    uvicorn.run(
+        "serenity.api.main:app",
+        host=args.host,
+        port=args.port,
+        reload=args.reload,
+        ws="websockets",
+        ws_ping_interval=settings.websocket_ping_interval_seconds,
+        ws_ping_timeout=settings.websocket_ping_timeout_seconds,
+    )
+
+
+if __name__ == "__main__":
+    main()
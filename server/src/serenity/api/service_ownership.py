@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from typing import Awaitable, Callable
+
+from serenity.common.config import settings
+from serenity.common.redis_client import RedisClient
+
+_LEASE_KEY = "services_owner"
+
+
+class ServiceOwnership:
+    """Makes sure a single API process runs the game services.
+
+    Every process serves websockets and the HTTP API, and reaches the services through the bus.
+    The owner holds a lease on the bus, renewed while it runs. If it dies, another electable
+    process takes the lease over once it expires and restores the services from their persisted state.
+    """
+
+    def __init__(self, redis: RedisClient) -> None:
+        self._redis = redis
+        self._id = f"{socket.gethostname()}-{os.getpid()}"
+        self.is_owner = False
+
+    async def run(self, start: Callable[[], Awaitable[None]], stop: Callable[[], Awaitable[None]]) -> None:
+        """Calls `start` when this process becomes the owner, and `stop` if it loses the lease.
+
+        The services only ever run while the lease is held, an "owner" that does not get it reports the
+        misconfiguration instead of running a second copy of the services.
+        """
+        if settings.services_role == "worker":
+            if settings.bus_backend == "memory":
+                raise ValueError("A worker cannot reach the services through the memory bus, use redis.")
+            logging.info("OWNERSHIP: Running as a worker, services run in another process.")
+            return
+
+        if settings.services_role == "elect" and settings.bus_backend == "memory":
+            raise ValueError(
+                "Processes cannot see each other through the memory bus, each would elect itself. "
+                "Use redis, or the owner role for a single process."
+            )
+
+        last_renewal = time.monotonic()
+        interval = settings.services_lease_seconds / 3
+        while True:
+            try:
+                holds_lease = await self._redis.claim(_LEASE_KEY, self._id, settings.services_lease_seconds)
+            except Exception as err:
+                logging.error("OWNERSHIP: Failed to renew the services lease: %s", err)
+                # Another process may take the lease over once it expires, the services must be stopped before
+                holds_lease = (
+                    self.is_owner and time.monotonic() - last_renewal + interval < settings.services_lease_seconds
+                )
+            else:
+                if holds_lease:
+                    last_renewal = time.monotonic()
+
+            if not holds_lease and not self.is_owner and settings.services_role == "owner":
+                logging.error("OWNERSHIP: Configured as owner, but another process holds the services lease.")
+            elif holds_lease and not self.is_owner:
+                logging.info("OWNERSHIP: %s elected to run the services.", self._id)
+                self.is_owner = True
+                await start()
+            elif not holds_lease and self.is_owner:
+                logging.error("OWNERSHIP: %s lost the services lease, stopping the services.", self._id)
+                self.is_owner = False
+                await stop()
+
+            await asyncio.sleep(interval)
+
+    async def release(self) -> None:
+        if self.is_owner:
+            await self._redis.release_claim(_LEASE_KEY, self._id)
+            self.is_owner = False
@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Hashable, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from serenity.api.encodings import Payload
+from serenity.common.config import settings
+from serenity.common.definitions import MessageType
+from serenity.common.metrics import websocket_conflated_messages, websocket_messages, websocket_send_seconds
+from serenity.common.redis_client import RedisMessage
+
+
+class WebsocketSender:
+    """Sends messages to a single websocket from its own task, so a slow client only delays itself.
+
+    Pending status messages are conflated: a newer state or config for a service replaces the one
+    still waiting to be sent. Other messages, e.g. damages, are events and are all kept.
+    """
+
+    def __init__(self, websocket: WebSocket, on_failure: Callable[[WebSocket], Awaitable[None]]) -> None:
+        self._websocket = websocket
+        self._on_failure = on_failure
+        self._pending: OrderedDict[Hashable, Payload] = OrderedDict()
+        self._has_pending = asyncio.Event()
+        self._behind_since: Optional[float] = None
+        self._event_ids = itertools.count()
+        self.sent = 0
+        self._task = asyncio.create_task(self._send_loop())
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def lag_seconds(self) -> float:
+        """Time since the client last made progress while messages were waiting."""
+        if self._behind_since is None:
+            return 0.0
+        return time.monotonic() - self._behind_since
+
+    @property
+    def is_stuck(self) -> bool:
+        return (
+            self.pending >= settings.websocket_send_queue_size or self.lag_seconds > settings.websocket_max_lag_seconds
+        )
+
+    def put(self, message: RedisMessage, payload: Payload, keyframe: Callable[[], Payload]) -> None:
+        """Queues an encoded message.
+
+        `keyframe` gives the full state payload, sent instead of a delta that replaces a pending
+        message, since the client would otherwise miss a version.
+        """
+        key = self._conflation_key(message)
+
+        if key in self._pending:
+            websocket_conflated_messages.inc()
+            if message.type == MessageType.STATE_DELTA:
+                payload = keyframe()
+
+        self._pending[key] = payload
+
+        if self._behind_since is None:
+            self._behind_since = time.monotonic()
+        self._has_pending.set()
+
+    def _conflation_key(self, message: RedisMessage) -> Hashable:
+        if message.type in (MessageType.STATE, MessageType.STATE_DELTA):
+            return (MessageType.STATE, message.concerns)
+        if message.type == MessageType.CONFIG:
+            return (MessageType.CONFIG, message.concerns)
+        return next(self._event_ids)
+
+    async def _send_loop(self) -> None:
+        while True:
+            await self._has_pending.wait()
+
+            _, payload = self._pending.popitem(last=False)
+            if not self._pending:
+                self._has_pending.clear()
+
+            try:
+                with websocket_send_seconds.time():
+                    if isinstance(payload, bytes):
+                        await self._websocket.send_bytes(payload)
+                    else:
+                        await self._websocket.send_text(payload)
+            except (RuntimeError, WebSocketDisconnect) as err:
+                logging.warning("Trying to send to %s, but connection is closed (%s).", self._websocket, err)
+                await self._on_failure(self._websocket)
+                return
+
+            websocket_messages.inc()
+            self.sent += 1
+            self._behind_since = time.monotonic() if self._pending else None
+
+    def close(self) -> None:
+        self._pending.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
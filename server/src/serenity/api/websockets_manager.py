@@ -1,6 +1,6 @@
-from ast import List, Tuple
-import json
-from typing import Dict, Set, Callable
+import itertools
+import time
+from typing import Dict, Optional, Set, Tuple
 import asyncio
 import logging
 
@@ -10,25 +10,103 @@ from fastapi import WebSocket, WebSocketDisconnect
 from serenity.common.adapter import Adapter
 
 from serenity.common.definitions import Jsonable, MessageType, ServiceType, Topic
+from serenity.api.connection import Connection
+from serenity.api.encodings import Encoding, Payload, encode
+from serenity.api.event_log import EventLog
+from serenity.api.websocket_sender import WebsocketSender
+from serenity.common.config import settings
+from serenity.common.metrics import (
+    websocket_connections,
+    websocket_lag_disconnects,
+    websocket_reaped,
+    websocket_rtt_seconds,
+)
 from serenity.common.redis_client import RedisClient, RedisMessage
+from serenity.common.snapshot import content_etag
+from serenity.common.versioning import MissedVersion, StateMirror, resync_request
 
 
 class WebsocketsManager:
-    def __init__(self) -> None:
+    def __init__(self, event_log: Optional[EventLog] = None) -> None:
+        self._event_log = event_log
+        self._connections: Dict[WebSocket, Connection] = {}
+        # Indexes of the connections, by topic and by the service they listen to (None for all of them)
         self._active_connections: Dict[Topic, Set[WebSocket]] = defaultdict(set)
+        self._routes: Dict[Tuple[Topic, Optional[ServiceType]], Set[WebSocket]] = defaultdict(set)
         self._redis = RedisClient()
-        self._adapters: Dict[Tuple[WebSocket, Topic], List[Adapter]] = defaultdict(list)
+        self._mirror = StateMirror()
+        self._closing: Set[asyncio.Task] = set()
+        self._ping_ids = itertools.count()
+        # Latest full state and config per service, with their payloads per adapter chain and encoding
+        self._latest: Dict[
+            Tuple[Topic, MessageType, ServiceType],
+            Tuple[RedisMessage, Dict[Tuple[Tuple[Adapter, ...], Encoding], Payload]],
+        ] = {}
+        self._latest_data: Dict[Tuple[Topic, MessageType, ServiceType], Tuple[str, bytes]] = {}
 
-    async def subscribe_to_broadcast(self, websocket: WebSocket, topics: Set[Topic]) -> None:
+        websocket_connections.set_function(lambda: self.connection_count)
+
+    async def subscribe_to_broadcast(
+        self,
+        websocket: WebSocket,
+        topics: Set[Topic],
+        deltas: bool = False,
+        services: Optional[Set[ServiceType]] = None,
+        types: Optional[Set[MessageType]] = None,
+        encoding: Encoding = Encoding.JSON,
+        heartbeat: bool = False,
+    ) -> None:
+        """Subscribes a websocket to topics.
+
+        With `deltas`, the websocket receives `STATE_DELTA` messages as published by the services,
+        unless an adapter transforms them, and must send an `INIT` proposal to resync when it misses
+        a version. Otherwise, it receives full `STATE` messages.
+
+        `services` and `types` restrict the messages sent to the websocket, everything by default.
+        Asking for `STATE` also covers `STATE_DELTA`, and messages concerning no service are always sent.
+
+        With `heartbeat`, the websocket receives a `PING` every `websocket_heartbeat_seconds` and must
+        answer with a `PONG` holding the same data. It is disconnected when it sends nothing for
+        `websocket_idle_timeout_seconds`. Other websockets are only dropped once a send fails.
+        """
         await websocket.accept()
 
-        for topic in topics:
+        connection = Connection(
+            websocket=websocket,
+            sender=WebsocketSender(websocket, self._remove_websocket),
+            topics=set(topics),
+            services=set(services) if services else None,
+            types=set(types) if types else None,
+            encoding=encoding,
+            deltas=deltas,
+            heartbeat=heartbeat,
+        )
+        self._connections[websocket] = connection
+
+        for topic in connection.topics:
             self._active_connections[topic].add(websocket)
+        for key in connection.route_keys():
+            self._routes[key].add(websocket)
 
     async def _remove_websocket(self, websocket: WebSocket) -> None:
-        for websockets in self._active_connections.values():
-            if websocket in websockets:
-                websockets.remove(websocket)
+        connection = self._connections.pop(websocket, None)
+        if connection is None:
+            return
+
+        for topic in connection.topics:
+            self._discard_from_index(self._active_connections, topic, websocket)
+        for key in connection.route_keys():
+            self._discard_from_index(self._routes, key, websocket)
+
+        connection.sender.close()
+
+    @staticmethod
+    def _discard_from_index(index: Dict, key: object, websocket: WebSocket) -> None:
+        websockets = index.get(key)
+        if websockets is not None:
+            websockets.discard(websocket)
+            if not websockets:
+                del index[key]
 
     async def _disconnect(self, websocket: WebSocket) -> None:
         try:
@@ -40,30 +118,143 @@ class WebsocketsManager:
             logging.warning("Websocket %s not found.", websocket)
 
     async def disconnect_all(self) -> None:
-        all_websockets = set(
-            [websocket for websockets in self._active_connections.values() for websocket in websockets]
-        )
-        await asyncio.gather(*[self._disconnect(connection) for connection in all_websockets])
+        await asyncio.gather(*[self._disconnect(websocket) for websocket in list(self._connections)])
+
+    @property
+    def connection_count(self) -> int:
+        return len(self._connections)
+
+    def _recipients(self, topic: Topic, concerns: Optional[ServiceType]) -> Set[WebSocket]:
+        if concerns is None:
+            return self._active_connections.get(topic, set())
+        return self._routes.get((topic, None), set()) | self._routes.get((topic, concerns), set())
 
     async def broadcast(self, message: RedisMessage):
-        websockets = self._active_connections[message.topic]
+        websockets = self._recipients(message.topic, message.concerns)
+
+        try:
+            full_message = self._mirror.apply(message)
+        except MissedVersion:
+            await self._redis.publish(resync_request(message.concerns))
+            return
+        if full_message is None:
+            return
+
+        if full_message.type in (MessageType.STATE, MessageType.CONFIG):
+            key = (full_message.topic, full_message.type, full_message.concerns)
+            self._latest[key] = (full_message, {})
+            self._latest_data.pop(key, None)
+
+        if self._event_log is not None:
+            await self._event_log.append(full_message)
 
-        for connection in websockets:
-            try:
-                message = self._adapt_if_needed(message, connection)
-                data = message.model_dump(mode="json")
+        # Connections with the same adapters, delta mode and encoding receive the same payload, encoded once
+        outgoings: Dict[Tuple[Tuple[Adapter, ...], bool], Jsonable] = {}
+        payloads: Dict[Tuple[Tuple[Adapter, ...], bool, Encoding], Payload] = {}
 
-                await connection.send_json(data)
-            except RuntimeError as err:
-                logging.warning("Trying to broadcast to %s, but connection is closed (%s).", connection, err)
-                await self._remove_websocket(connection)
+        def payload(adapters: Tuple[Adapter, ...], sends_delta: bool, encoding: Encoding) -> Payload:
+            if (adapters, sends_delta) not in outgoings:
+                outgoing = message if sends_delta else self._adapt(full_message, adapters)
+                outgoings[(adapters, sends_delta)] = outgoing.model_dump(mode="json")
+
+            group = (adapters, sends_delta, encoding)
+            if group not in payloads:
+                payloads[group] = encode(outgoings[(adapters, sends_delta)], encoding)
+            return payloads[group]
+
+        # Sending happens in each connection's own task, a slow client does not hold the others back
+        for websocket in list(websockets):
+            connection = self._connections.get(websocket)
+            if connection is None or not connection.wants(message.type):
+                continue
+
+            sender = connection.sender
+            if sender.is_stuck:
+                logging.warning(
+                    "Websocket %s is %.1fs behind with %d pending messages, disconnecting.",
+                    websocket,
+                    sender.lag_seconds,
+                    sender.pending,
+                )
+                websocket_lag_disconnects.inc()
+                self._disconnect_in_background(websocket)
+                continue
+
+            adapters = connection.adapter_chain(message.topic)
+            sends_delta = self._sends_delta(message, adapters, connection)
+            encoding = connection.encoding
+            sender.put(
+                message,
+                payload(adapters, sends_delta, encoding),
+                lambda adapters=adapters, encoding=encoding: payload(adapters, False, encoding),
+            )
 
-    def _adapt_if_needed(self, message: RedisMessage, connection: WebSocket) -> RedisMessage:
-        if (connection, message.topic) in self._adapters:
-            adapters = self._adapters[(connection, message.topic)]
-            for adapter in adapters:
-                message = adapter.adapt_if_needed(message)
+    def latest_status(
+        self, topic: Topic, message_type: MessageType, concerns: ServiceType
+    ) -> Optional[Tuple[str, bytes]]:
+        """Etag and JSON data of the latest state or config broadcasted for a service, if any.
 
+        The etag is the one the service owner serves for the same data, so all the processes agree on it.
+        """
+        key = (topic, message_type, concerns)
+        if key not in self._latest:
+            return None
+
+        if key not in self._latest_data:
+            data = self._latest[key][0].data
+            json = orjson.dumps(data)  # pylint: disable=maybe-no-member
+            self._latest_data[key] = (content_etag(concerns, data), json)
+        return self._latest_data[key]
+
+    async def send_snapshot(self, websocket: WebSocket, topic: Topic, concerns: Set[ServiceType]) -> None:
+        """Sends the latest state and config of some services to a single websocket.
+
+        Must be called right after subscribing, so no broadcast can be queued before the snapshot.
+        Services that did not broadcast yet are asked to, which reaches every client only once.
+        Services and types filtered out by the subscription are skipped.
+        """
+        connection = self._connections[websocket]
+        group = (connection.adapter_chain(topic), connection.encoding)
+        missing = set()
+
+        for service in concerns:
+            if websocket not in self._recipients(topic, service):
+                continue
+
+            for message_type in (MessageType.STATE, MessageType.CONFIG):
+                if not connection.wants(message_type):
+                    continue
+                if (topic, message_type, service) not in self._latest:
+                    missing.add(service)
+                    continue
+
+                message, payloads = self._latest[(topic, message_type, service)]
+                if group not in payloads:
+                    adapters, encoding = group
+                    payloads[group] = encode(self._adapt(message, adapters).model_dump(mode="json"), encoding)
+                connection.sender.put(message, payloads[group], lambda payload=payloads[group]: payload)
+
+        for service in missing:
+            await self._redis.publish(resync_request(service))
+
+    def _disconnect_in_background(self, websocket: WebSocket) -> None:
+        """Closing a stuck websocket may itself block, so it must not delay the broadcast."""
+        task = asyncio.create_task(self._disconnect(websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    def _sends_delta(message: RedisMessage, adapters: Tuple[Adapter, ...], connection: Connection) -> bool:
+        """Deltas are forwarded as is, unless an adapter of the connection would change the full state."""
+        if message.type != MessageType.STATE_DELTA or not connection.deltas:
+            return False
+
+        return all(adapter.status_model.to_key() != message.concerns for adapter in adapters)
+
+    @staticmethod
+    def _adapt(message: RedisMessage, adapters: Tuple[Adapter, ...]) -> RedisMessage:
+        for adapter in adapters:
+            message = adapter.adapt_if_needed(message)
         return message
 
     async def broadcast_loop(self, topic: Topic):
@@ -73,22 +264,65 @@ class WebsocketsManager:
         async for message in subscription:
             await self.broadcast(message)
 
+    async def heartbeat_loop(self) -> None:
+        """Pings the websockets that opted in to heartbeats, and reaps those that went silent."""
+        while True:
+            await asyncio.sleep(settings.websocket_heartbeat_seconds)
+
+            for websocket, connection in list(self._connections.items()):
+                if not connection.heartbeat:
+                    continue
+
+                if connection.idle_seconds > settings.websocket_idle_timeout_seconds:
+                    logging.warning("Websocket %s silent for %.1fs, disconnecting.", websocket, connection.idle_seconds)
+                    websocket_reaped.inc()
+                    self._disconnect_in_background(websocket)
+                    continue
+
+                self._ping(connection)
+
+    def _ping(self, connection: Connection) -> None:
+        ping_id = next(self._ping_ids)
+        connection.ping = (ping_id, time.monotonic())
+
+        message = RedisMessage(topic=Topic.BROADCAST_STATUS, type=MessageType.PING, data={"id": ping_id})
+        payload = encode(message.model_dump(mode="json"), connection.encoding)
+        connection.sender.put(message, payload, lambda: payload)
+
+    def _on_pong(self, connection: Connection, data: Jsonable) -> None:
+        if connection.ping is None or not isinstance(data, dict) or data.get("id") != connection.ping[0]:
+            return
+
+        websocket_rtt_seconds.observe(time.monotonic() - connection.ping[1])
+        connection.ping = None
+
     async def forward_socket_messages(self, websocket: WebSocket):
+        """Publishes the messages of the websocket until it disconnects, or the server disconnects it."""
         try:
-            while True:
+            # Lagging and silent websockets are disconnected by the server, their receiving must stop too
+            while websocket in self._connections:
                 try:
                     await self._receive_and_publish(websocket)
-                except (WebSocketDisconnect, asyncio.CancelledError) as err:
+                except (WebSocketDisconnect, RuntimeError, asyncio.CancelledError) as err:
                     raise err
                 except Exception as err:
                     logging.error("Error while receiving and publishing: %s", err)
-        except WebSocketDisconnect:
-            await self._disconnect(websocket)
+        except (WebSocketDisconnect, RuntimeError):
+            # Starlette raises a RuntimeError when receiving on a websocket that was closed
+            if websocket in self._connections:
+                await self._disconnect(websocket)
 
     async def _receive_and_publish(self, websocket):
         message = await websocket.receive_text()
         message = orjson.loads(message)  # pylint: disable=maybe-no-member
 
+        connection = self._connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+            if message.get("type") == MessageType.PONG:
+                self._on_pong(connection, message.get("data"))
+                return
+
         try:
             redis_message = RedisMessage(
                 topic=Topic(message["topic"]),
@@ -101,4 +335,4 @@ class WebsocketsManager:
             logging.error("Invalid message received: %s, %s", message, err)
 
     async def add_adapter(self, websocket: WebSocket, topic: Topic, adapter: Adapter) -> None:
-        self._adapters[(websocket, topic)].append(adapter)
+        self._connections[websocket].adapters[topic].append(adapter)
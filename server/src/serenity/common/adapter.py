@@ -31,6 +31,7 @@ class Adapter(ABC, Generic[T]):
             topic=message.topic,
             type=message.type,
             concerns=message.concerns,
+            version=message.version,
             data=new_data,
         )
 
@@ -0,0 +1,177 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import defaultdict
+import logging
+from typing import AsyncContextManager, AsyncIterator, Dict, List, Optional, Tuple
+
+import orjson
+from pydantic_core import to_jsonable_python
+from redis.asyncio import StrictRedis
+
+from serenity.common.config import settings
+from serenity.common.definitions import Jsonable, RedisMessage, Topic
+
+
+def encode_message(message: RedisMessage) -> bytes:
+    return orjson.dumps(message.model_dump(mode="json"))  # pylint: disable=maybe-no-member
+
+
+class Bus(ABC):
+    """Key-value store, pubsub and locks behind `RedisClient`."""
+
+    empty_polls: int = 0
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Jsonable]:
+        pass
+
+    @abstractmethod
+    async def execute(self, sets: List[Tuple[str, Jsonable]], messages: List[RedisMessage]) -> None:
+        """Stores the values then publishes the messages, in a single round trip when possible."""
+
+    @abstractmethod
+    def listen(self) -> AsyncIterator[RedisMessage]:
+        """Iterates over the messages published on every topic. Meant for a single consumer per process."""
+
+    @abstractmethod
+    def lock(self, key: str) -> AsyncContextManager:
+        pass
+
+    @abstractmethod
+    async def release_all_locks(self) -> None:
+        pass
+
+    @abstractmethod
+    async def claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        """Takes or renews a lease on `key` for `ttl_seconds`, True if `owner` holds it afterwards."""
+
+    @abstractmethod
+    async def release_claim(self, key: str, owner: str) -> None:
+        """Ends the lease on `key` early, if `owner` holds it."""
+
+
+# Only touch the lease if it is still held by the caller, it may have expired and been taken meanwhile
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end
+"""
+
+
+class RedisBus(Bus):
+    def __init__(self) -> None:
+        self._client: StrictRedis = StrictRedis(host=settings.redis_host, port=settings.redis_port)
+
+    async def get(self, key: str) -> Optional[Jsonable]:
+        value = await self._client.get(key)
+        if value is None:
+            return None
+        return orjson.loads(value)  # pylint: disable=maybe-no-member
+
+    async def execute(self, sets: List[Tuple[str, Jsonable]], messages: List[RedisMessage]) -> None:
+        async with self._client.pipeline(transaction=False) as pipeline:
+            for key, value in sets:
+                pipeline.set(key, orjson.dumps(value))  # pylint: disable=maybe-no-member
+            for message in messages:
+                pipeline.publish(message.topic.value, encode_message(message))
+            await pipeline.execute()
+
+    async def listen(self) -> AsyncIterator[RedisMessage]:
+        """Blocks on the pubsub socket until a message arrives or the timeout expires.
+
+        The timeout doubles after each empty poll, up to `redis_poll_max_timeout_seconds`,
+        and is reset as soon as a message is received. A blocking read wakes up as soon as
+        data is available, so a longer timeout only reduces idle wake-ups.
+        """
+        timeout = settings.redis_poll_timeout_seconds
+
+        async with self._client.pubsub() as pubsub:
+            await pubsub.subscribe(*[topic.value for topic in Topic])
+            while True:
+                try:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+
+                    if message is None:
+                        self.empty_polls += 1
+                        timeout = min(timeout * 2, settings.redis_poll_max_timeout_seconds)
+                        continue
+
+                    timeout = settings.redis_poll_timeout_seconds
+                    yield RedisMessage(**orjson.loads(message["data"]))  # pylint: disable=maybe-no-member
+                except asyncio.CancelledError as err:
+                    raise err
+                except Exception as err:
+                    logging.error("REDIS: Error while reading subscriptions: %s", err)
+                    await asyncio.sleep(settings.redis_poll_timeout_seconds)
+
+    def lock(self, key: str) -> AsyncContextManager:
+        return self._client.lock(f"__lock__{key}", timeout=30)
+
+    async def release_all_locks(self) -> None:
+        await self._client.delete("__lock__*")
+
+    async def claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        ttl = int(ttl_seconds * 1000)
+        if await self._client.set(f"__lease__{key}", owner, nx=True, px=ttl):
+            return True
+        return bool(await self._client.eval(_RENEW_SCRIPT, 1, f"__lease__{key}", owner, ttl))
+
+    async def release_claim(self, key: str, owner: str) -> None:
+        await self._client.eval(_RELEASE_SCRIPT, 1, f"__lease__{key}", owner)
+
+
+class MemoryBus(Bus):
+    """In process bus, for when all services and the API run in the same process.
+
+    Published messages skip the bytes round trip: their data is only converted to
+    its json-compatible form, as consumers would receive it from redis.
+    """
+
+    def __init__(self) -> None:
+        self._store: Dict[str, Jsonable] = {}
+        self._messages: asyncio.Queue[RedisMessage] = asyncio.Queue()
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def get(self, key: str) -> Optional[Jsonable]:
+        return self._store.get(key)
+
+    async def execute(self, sets: List[Tuple[str, Jsonable]], messages: List[RedisMessage]) -> None:
+        for key, value in sets:
+            self._store[key] = to_jsonable_python(value)
+        for message in messages:
+            self._messages.put_nowait(
+                RedisMessage.model_construct(
+                    topic=message.topic,
+                    type=message.type,
+                    concerns=message.concerns,
+                    version=message.version,
+                    data=to_jsonable_python(message.data),
+                )
+            )
+
+    async def listen(self) -> AsyncIterator[RedisMessage]:
+        while True:
+            yield await self._messages.get()
+
+    def lock(self, key: str) -> AsyncContextManager:
+        return self._locks[key]
+
+    async def release_all_locks(self) -> None:
+        self._locks.clear()
+
+    async def claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        # Nothing else can share this bus, the single process always holds the lease
+        return True
+
+    async def release_claim(self, key: str, owner: str) -> None:
+        pass
+
+
+def create_bus() -> Bus:
+    match settings.bus_backend:
+        case "redis":
+            return RedisBus()
+        case "memory":
+            return MemoryBus()
+    raise ValueError(f"Unknown bus backend: {settings.bus_backend}.")
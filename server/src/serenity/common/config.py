@@ -12,21 +12,54 @@ class Settings(BaseSettings):
     restore_persisted_state: bool = True
     log_level: int = logging.DEBUG
 
+    # ---------------------------------------------------
+    # Services
+    # ---------------------------------------------------
+    persist_window_seconds: float = 1.0
+    service_mailbox_size: int = 100
+    state_keyframe_interval: int = 20  # full state every n versions, deltas in between
+    # Which API processes run the services: "owner" and "elect" do while they hold the lease, "owner"
+    # reporting an error when it cannot get it, "worker" never does. Only "owner" can use the memory bus.
+    services_role: Literal["elect", "owner", "worker"] = "elect"
+    services_lease_seconds: float = 10.0
+
     # ---------------------------------------------------
     # CORS
     # ---------------------------------------------------
     cors_origins: list = ["*"]
 
     # ---------------------------------------------------
-    # Redis
+    # Websockets
+    # ---------------------------------------------------
+    websocket_send_queue_size: int = 32  # pending messages per client, after conflation
+    websocket_max_lag_seconds: float = 5.0  # a client making no progress for this long is disconnected
+    websocket_deflate_level: int = 6  # zlib level of the "deflate" payload encoding
+    websocket_ping_interval_seconds: float = 15.0  # protocol pings, answered by every browser
+    websocket_ping_timeout_seconds: float = 30.0  # a websocket not answering a ping for this long is closed
+    websocket_heartbeat_seconds: float = 15.0  # ping interval of websockets opting in to heartbeats
+    websocket_idle_timeout_seconds: float = 45.0  # such websockets are reaped after this long without a message
+
+    # ---------------------------------------------------
+    # Server-sent events
+    # ---------------------------------------------------
+    sse_buffer_size: int = 256  # events kept for resuming clients, older gaps get a snapshot
+    sse_keepalive_seconds: float = 15.0
+
+    # ---------------------------------------------------
+    # Bus
     # ---------------------------------------------------
+    # "memory" keeps everything in process, for single machine deployments without redis
+    bus_backend: Literal["redis", "memory"] = "redis"
     redis_host: str = "localhost"
     redis_port: int = 6379
+    redis_poll_timeout_seconds: float = 0.5
+    redis_poll_max_timeout_seconds: float = 30.0
 
     # ---------------------------------------------------
     # Travel
     # ---------------------------------------------------
     travel_tick_seconds: float = 0.3
+    travel_adapter_cache_size: int = 32  # adapted travel graphs kept for the dashboards
 
     # ---------------------------------------------------
     # Sonar
@@ -46,6 +79,7 @@ class Settings(BaseSettings):
     sonar_mine_radius: int = 2
     sonar_player_default_hp: int = 4
     sonar_use_control_panel: bool= True
+    sonar_broadcast_window_seconds: float = 0.03
 
     # ---------------------------------------------------
     # Paths
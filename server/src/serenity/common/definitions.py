@@ -3,7 +3,7 @@ from abc import ABC, abstractmethod
 
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -27,8 +27,11 @@ class MessageType(str, Enum):
     SYSTEM = "system"
     INIT = "init"
     STATE = "state"
+    STATE_DELTA = "state_delta"
     CONFIG = "config"
     TAKEOFF = "takeoff"
+    PAUSE_TRAVEL = "pause_travel"
+    RESUME_TRAVEL = "resume_travel"
     START_BATTLE = "start_battle"
     END_BATTLE = "end_battle"
     LAUNCH_TORPEDO = "launch_torpedo"
@@ -40,6 +43,8 @@ class MessageType(str, Enum):
     DIRECT_DAMAGE = "direct_damage"
     SURFACE = "surface"
     BACKGROUND_SOUND = "background_sound"
+    PING = "ping"
+    PONG = "pong"
 
 
 class ServiceType(str, Enum):
@@ -55,6 +60,14 @@ class Owner(str, Enum):
     NPCS = "npcs"
 
 
+class RedisMessage(BaseModel):
+    topic: Topic
+    type: MessageType
+    concerns: Optional[ServiceType] = None
+    version: Optional[int] = None
+    data: Optional[Any] = None
+
+
 class StatusBaseModel(BaseModel, ABC):
     @staticmethod
     @abstractmethod
@@ -0,0 +1,164 @@
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(ABC):
+    type_name = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        pass
+
+
+class ScalarMetric(Metric):
+    """Metric with a single value per label set, either stored or read from a function at scrape time."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = defaultdict(float)
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set_function(self, function: Callable[[], float], **labels: str) -> None:
+        self._functions[self._label_values(labels)] = function
+
+    def _samples(self) -> List[str]:
+        values = {**self._values, **{labels: function() for labels, function in self._functions.items()}}
+        return [f"{self.name}{_format_labels(self.labels, labels)} {value}" for labels, value in values.items()]
+
+
+class Counter(ScalarMetric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self._values[self._label_values(labels)] += amount
+
+
+class Gauge(ScalarMetric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._label_values(labels)] = value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = defaultdict(float)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observes the duration of the block, in seconds, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, counts in self._counts.items():
+            cumulated = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulated += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulated}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {self._sums[values]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulated}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_seconds = registry.register(
+    Histogram("serenity_handler_seconds", "Time spent handling a message.", ["handler"])
+)
+bus_seconds = registry.register(Histogram("serenity_bus_seconds", "Time spent in bus operations.", ["operation"]))
+published_messages = registry.register(
+    Counter("serenity_published_messages_total", "Messages published on the bus.", ["topic"])
+)
+websocket_send_seconds = registry.register(
+    Histogram("serenity_websocket_send_seconds", "Time spent sending a message to a websocket.")
+)
+websocket_messages = registry.register(Counter("serenity_websocket_messages_total", "Messages sent to websockets."))
+queue_depth = registry.register(Gauge("serenity_queue_depth", "Number of items waiting in a queue.", ["queue"]))
+empty_polls = registry.register(Counter("serenity_bus_empty_polls_total", "Subscription polls that timed out empty."))
+websocket_conflated_messages = registry.register(
+    Counter("serenity_websocket_conflated_messages_total", "Queued websocket messages replaced by a newer one.")
+)
+websocket_lag_disconnects = registry.register(
+    Counter("serenity_websocket_lag_disconnects_total", "Websockets disconnected for falling too far behind.")
+)
+websocket_encode_seconds = registry.register(
+    Histogram("serenity_websocket_encode_seconds", "Time spent encoding a websocket payload.", ["encoding"])
+)
+websocket_payload_bytes = registry.register(
+    Histogram(
+        "serenity_websocket_payload_bytes",
+        "Size of encoded websocket payloads.",
+        ["encoding"],
+        buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576),
+    )
+)
+websocket_connections = registry.register(Gauge("serenity_websocket_connections", "Open websocket connections."))
+websocket_rtt_seconds = registry.register(
+    Histogram("serenity_websocket_rtt_seconds", "Round trip time of websocket heartbeats.")
+)
+websocket_reaped = registry.register(
+    Counter("serenity_websocket_reaped_total", "Websockets disconnected for missing their heartbeats.")
+)
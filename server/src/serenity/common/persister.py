@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Dict, Set
+
+from serenity.common.config import settings
+from serenity.common.dict_convertible import DictConvertible
+from serenity.common.redis_client import RedisClient
+
+
+class Persister:
+    """Write-behind persistence for dict convertible objects.
+
+    Objects are marked dirty on change and written once per `persist_window_seconds`,
+    whatever the number of changes in between. `close` must be awaited on shutdown
+    to flush the last changes.
+    """
+
+    def __init__(self, redis: RedisClient) -> None:
+        self._redis = redis
+        self._dirty: Dict[str, DictConvertible] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._flush_scheduled = False
+        self._flush_lock = asyncio.Lock()  # a failed flush puts its objects back, it must not overtake a newer one
+        self._closing = False
+        self._discards = 0  # dirty objects taken by a flush are not put back once discarded
+
+    def mark_dirty(self, key: str, obj: DictConvertible) -> None:
+        self._dirty[key] = obj
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_scheduled or self._closing:
+            return
+
+        self._flush_scheduled = True
+        task = asyncio.create_task(self._flush_later())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(settings.persist_window_seconds)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Writes all dirty objects in a single pipeline.
+
+        Objects changed while it writes, or that could not be written, are written by the next flush.
+        """
+        async with self._flush_lock:
+            # Changes from now on need another flush, this one already took the objects to write
+            self._flush_scheduled = False
+            dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return
+
+            discards = self._discards
+            try:
+                async with self._redis.batch() as batch:
+                    for key, obj in dirty.items():
+                        batch.set(key, obj.to_dict())
+            except asyncio.CancelledError as err:
+                self._put_back(dirty, discards)
+                raise err
+            except Exception as err:
+                logging.error("PERSISTER: Failed to persist %s: %s", list(dirty), err)
+                self._put_back(dirty, discards)
+
+            if self._dirty:
+                self._schedule_flush()
+
+    def _put_back(self, dirty: Dict[str, DictConvertible], discards: int) -> None:
+        if discards != self._discards:
+            return
+        for key, obj in dirty.items():
+            self._dirty.setdefault(key, obj)  # unless a newer change is pending
+
+    def _cancel_flushes(self) -> None:
+        for task in self._flush_tasks:
+            task.cancel()
+        self._flush_scheduled = False
+
+    def discard(self) -> None:
+        """Forgets the pending changes, when another process took over the objects."""
+        self._cancel_flushes()
+        self._dirty = {}
+        self._discards += 1
+
+    async def close(self) -> None:
+        self._closing = True
+        tasks = list(self._flush_tasks)
+        self._cancel_flushes()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.flush()
@@ -1,81 +1,193 @@
 import asyncio
-from functools import singledispatchmethod
-import logging
-from math import log
-from typing import Any, Optional, Type
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import AsyncContextManager, AsyncIterator, Dict, List, Optional, Set, Tuple
 
-import orjson
-from pydantic import BaseModel
-from redis.asyncio import StrictRedis
-from redis.asyncio.lock import Lock
-
-from serenity.common.config import settings
+from serenity.common.bus import Bus, create_bus
+from serenity.common.metrics import bus_seconds, empty_polls, published_messages, queue_depth
 from serenity.common.definitions import (
     MessageType,
     Jsonable,
+    RedisMessage,
     ServiceType,
     Topic,
     RedisSignal,
 )
 
 
-class RedisMessage(BaseModel):
-    topic: Topic
-    type: MessageType
-    concerns: Optional[ServiceType] = None
-    data: Optional[Any] = None
+class RedisBatch:
+    """Queues sets and publishes, sent in a single round trip when the batch is executed."""
+
+    def __init__(self) -> None:
+        self._sets: List[Tuple[str, Jsonable]] = []
+        self._messages: List[RedisMessage] = []
+
+    def set(self, key: str, value: Jsonable) -> None:
+        self._sets.append((key, value))
+
+    def publish(self, message: RedisMessage) -> None:
+        self._messages.append(message)
+
+    async def execute(self, bus: Bus) -> None:
+        if self._sets or self._messages:
+            with bus_seconds.time(operation="batch"):
+                await bus.execute(self._sets, self._messages)
+            for message in self._messages:
+                published_messages.inc(topic=message.topic.value)
+
+
+class Subscriber:
+    """In-process consumer of a topic, fed by the multiplexer."""
+
+    def __init__(
+        self,
+        topic: Topic,
+        types: Optional[Set[MessageType]] = None,
+        concerns: Optional[Set[ServiceType]] = None,
+    ) -> None:
+        self.topic = topic
+        self.types = types
+        self.concerns = concerns
+        self.queue: asyncio.Queue[RedisMessage] = asyncio.Queue()
+
+    def accepts(self, message: RedisMessage) -> bool:
+        if message.type == MessageType.SYSTEM:
+            return True  # System signals always go through, e.g. shutdown
+        if self.types is not None and message.type not in self.types:
+            return False
+        if self.concerns is not None and message.concerns not in self.concerns:
+            return False
+        return True
+
+
+class SubscriptionMultiplexer:
+    """Holds the single subscription of the process to the bus.
+
+    Every message is decoded once and fanned out to the in-process subscribers
+    whose filters accept it.
+    """
+
+    def __init__(self, bus: Bus) -> None:
+        self._bus = bus
+        self._subscribers: Dict[Topic, Set[Subscriber]] = defaultdict(set)
+        self._reader: Optional[asyncio.Task] = None
+
+    def subscribe(
+        self,
+        topic: Topic,
+        types: Optional[Set[MessageType]] = None,
+        concerns: Optional[Set[ServiceType]] = None,
+    ) -> Subscriber:
+        subscriber = Subscriber(topic, types, concerns)
+        self._subscribers[topic].add(subscriber)
+        self._ensure_reader()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers[subscriber.topic].discard(subscriber)
+
+    def queue_depth(self, topic: Topic) -> int:
+        """Number of messages of a topic waiting to be consumed, over all subscribers."""
+        return sum(subscriber.queue.qsize() for subscriber in self._subscribers[topic])
+
+    def _ensure_reader(self) -> None:
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read_loop())
+
+    def _dispatch(self, message: RedisMessage) -> None:
+        for subscriber in self._subscribers[message.topic]:
+            if subscriber.accepts(message):
+                subscriber.queue.put_nowait(message)
+
+    async def _read_loop(self) -> None:
+        async for message in self._bus.listen():
+            self._dispatch(message)
+
+    def shutdown(self) -> None:
+        """Ends the subscription iterators of this process only."""
+        for topic in Topic:
+            self._dispatch(RedisMessage(topic=topic, type=MessageType.SYSTEM, data=RedisSignal.SHUTDOWN))
+
+
+bus = create_bus()
+multiplexer = SubscriptionMultiplexer(bus)
+
+empty_polls.set_function(lambda: bus.empty_polls)
+for _topic in Topic:
+    queue_depth.set_function(partial(multiplexer.queue_depth, _topic), queue=f"subscriptions_{_topic.value}")
 
 
 class RedisClient:
-    def __init__(self) -> None:
-        host = settings.redis_host
-        port = settings.redis_port
+    """Entry point to the bus selected by `settings.bus_backend`, shared by the whole process."""
 
-        self._client: StrictRedis = StrictRedis(host=host, port=port)
+    def __init__(self) -> None:
+        self._bus = bus
 
     async def get(self, key: str) -> Optional[Jsonable]:
-        value = await self._client.get(key)
-        if value is None:
-            return None
-        return orjson.loads(value)  # pylint: disable=maybe-no-member
+        with bus_seconds.time(operation="get"):
+            return await self._bus.get(key)
 
     async def set(self, key: str, value: Jsonable) -> None:
-        await self._client.set(key, orjson.dumps(value))  # pylint: disable=maybe-no-member
+        with bus_seconds.time(operation="set"):
+            await self._bus.execute([(key, value)], [])
 
     async def publish(self, message: RedisMessage) -> None:
         # logging.debug("REDIS: Publishing, %s", str(message)[:200])
-        await self._client.publish(
-            message.topic.value, orjson.dumps(message.model_dump(mode="json"))  # pylint: disable=maybe-no-member
-        )
-
-    async def subscription_iterator(self, topic: Topic) -> RedisMessage:
-        async with self._client.pubsub() as pubsub:
-            await pubsub.subscribe(topic.value)
+        with bus_seconds.time(operation="publish"):
+            await self._bus.execute([], [message])
+        published_messages.inc(topic=message.topic.value)
+
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator[RedisBatch]:
+        """Pipelines the sets and publishes queued in the context, sent on exit.
+
+        Nothing is sent if the context exits with an exception.
+        """
+        batch = RedisBatch()
+        yield batch
+        await batch.execute(self._bus)
+
+    async def subscription_iterator(
+        self,
+        topic: Topic,
+        types: Optional[Set[MessageType]] = None,
+        concerns: Optional[Set[ServiceType]] = None,
+    ) -> AsyncIterator[RedisMessage]:
+        """Iterates over the messages of a topic, optionally filtered on their type and concerns.
+
+        All iterators of the process share the same subscription, see `SubscriptionMultiplexer`.
+        """
+        subscriber = multiplexer.subscribe(topic, types, concerns)
+        try:
             while True:
-                try:
-                    message = await pubsub.get_message(ignore_subscribe_messages=True)
+                message = await subscriber.queue.get()
 
-                    if message is not None:                        
-                        message = RedisMessage(**orjson.loads(message["data"]))  # pylint: disable=maybe-no-member
+                match message:
+                    case RedisMessage(type=MessageType.SYSTEM, data=RedisSignal.SHUTDOWN):
+                        return
+                    case _:
+                        yield message
+        finally:
+            multiplexer.unsubscribe(subscriber)
 
-                        match message:
-                            case RedisMessage(topic=topic, type=MessageType.SYSTEM, data=RedisSignal.SHUTDOWN):
-                                return
-                            case _:
-                                yield message
-                except asyncio.CancelledError as err:
-                    raise err
-                except Exception as err:
-                    logging.error("REDIS: Error while iterating over subscription: %s", err)
+    @property
+    def empty_polls(self) -> int:
+        """Number of subscription polls that timed out without a message, for monitoring."""
+        return self._bus.empty_polls
 
-    def get_lock(self, key: str) -> Lock:
-        return self._client.lock(f"__lock__{key}", timeout=30)
+    def get_lock(self, key: str) -> AsyncContextManager:
+        return self._bus.lock(key)
 
     async def release_all_locks(self) -> None:
-        await self._client.delete("__lock__*")
+        await self._bus.release_all_locks()
+
+    async def claim(self, key: str, owner: str, ttl_seconds: float) -> bool:
+        return await self._bus.claim(key, owner, ttl_seconds)
+
+    async def release_claim(self, key: str, owner: str) -> None:
+        await self._bus.release_claim(key, owner)
 
     async def terminate_all_channels(self) -> None:
-        for topic in Topic:
-            await self.publish(
-                RedisMessage(topic=topic, type=MessageType.SYSTEM, data=RedisSignal.SHUTDOWN),
-            )
+        """Ends the subscriptions of this process, other processes sharing the bus keep theirs."""
+        multiplexer.shutdown()
@@ -1,20 +1,27 @@
 import asyncio
-from typing import Generic, List, Self, TypeVar
+from typing import Any, Awaitable, Callable, Generic, List, Optional, Self, TypeVar
 from pydantic import BaseModel
 from abc import ABC, ABCMeta, abstractmethod
 
 from typing import Type
+from serenity.common.config import settings
 from serenity.common.definitions import Jsonable, StatusBaseModel, MessageType, ServiceType, Topic
 import logging
 from serenity.common.redis_client import RedisClient, RedisMessage
 from serenity.common.dict_convertible import DictConvertible
-from redis.asyncio.lock import Lock
-
+from serenity.common.metrics import queue_depth
+from serenity.common.persister import Persister
+from serenity.common.snapshot import Snapshot
+from serenity.common.versioning import make_patch
 
 StateModel = TypeVar("StateModel", bound=StatusBaseModel)
 ConfigModel = TypeVar("ConfigModel", bound=StatusBaseModel)
 
 
+class ServiceStopped(Exception):
+    """Raised for the actions submitted to a service that was stopped before executing them."""
+
+
 class Service(DictConvertible, ABC, Generic[StateModel, ConfigModel]):
     # -----------------------------------------------
     # Abstract methods
@@ -63,17 +70,102 @@ class Service(DictConvertible, ABC, Generic[StateModel, ConfigModel]):
 
     state_type: StateModel = StateModel
 
+    # State changes within this window are broadcasted once, with the latest state. 0 broadcasts each change.
+    broadcast_window_seconds: float = 0.0
+
     redis = RedisClient()
+    persister = Persister(redis)
 
     def __init__(self, state: StateModel, config: ConfigModel) -> None:
+        self._mailbox: asyncio.Queue = asyncio.Queue(maxsize=settings.service_mailbox_size)
+        self._mailbox_task: Optional[asyncio.Task] = None
+        self._stopped = False
+        queue_depth.set_function(lambda: self.mailbox_depth, queue=f"mailbox_{self.state_type.to_key().value}")
+
+        self._state_version = 0
+        self._broadcasted_state: Optional[Jsonable] = None
+        self._scheduled_broadcast: Optional[asyncio.Task] = None
+
+        self._state_snapshot: Optional[Snapshot[StateModel]] = None
+        self._config_snapshot: Optional[Snapshot[ConfigModel]] = None
+
         self._update_state(state)
         self._update_config(config)
 
-    def get_self_lock(self) -> Lock:
-        return self.redis.get_lock(type(self).__name__)
-
-    async def _persist(self) -> None:
-        await self.redis.set(self._get_save_key(), self.to_dict())
+    @property
+    def mailbox_depth(self) -> int:
+        """Number of actions waiting to be executed by the service."""
+        return self._mailbox.qsize()
+
+    async def submit(self, action: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Executes an action in the mailbox of the service and returns its result.
+
+        Actions of a service run one at a time, in submission order, so they can
+        mutate the service without locking. Actions submitted from within the
+        mailbox (e.g. an action calling `update_state`) are executed directly.
+        """
+        if asyncio.current_task() is self._mailbox_task:
+            return await action(*args, **kwargs)
+
+        if self._stopped:
+            raise ServiceStopped()
+
+        future = asyncio.get_running_loop().create_future()
+        await self._mailbox.put((action, args, kwargs, future))
+        if self._stopped:  # stopped while waiting for room in the mailbox
+            raise ServiceStopped()
+        return await future
+
+    async def _drain_mailbox(self) -> None:
+        while True:
+            action, args, kwargs, future = await self._mailbox.get()
+            try:
+                result = await action(*args, **kwargs)
+            except asyncio.CancelledError as err:
+                if not future.done():
+                    future.set_exception(ServiceStopped())
+                raise err
+            except Exception as err:
+                if not future.done():
+                    future.set_exception(err)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    def abandon(self) -> None:
+        """Fails the actions left in the mailbox and cancels the scheduled broadcast, once the service stopped."""
+        self._stopped = True
+        self._cancel_scheduled_broadcast()
+
+        while not self._mailbox.empty():
+            *_, future = self._mailbox.get_nowait()
+            if not future.done():
+                future.set_exception(ServiceStopped())
+
+    def state_snapshot(self) -> Snapshot[StateModel]:
+        """The current state, cached until the service changes."""
+        if self._state_snapshot is None:
+            self._state_snapshot = Snapshot(self.to_state())
+        return self._state_snapshot
+
+    def config_snapshot(self) -> Snapshot[ConfigModel]:
+        """The current config, cached until the service changes."""
+        if self._config_snapshot is None:
+            self._config_snapshot = Snapshot(self.to_config())
+        return self._config_snapshot
+
+    def _invalidate_snapshots(self) -> None:
+        self._state_snapshot = None
+        self._config_snapshot = None
+
+    def _mark_changed(self) -> None:
+        """To be called after each change of the service.
+
+        Snapshots are invalidated and the service is marked as dirty, it is written
+        to redis by the persister shortly after.
+        """
+        self._invalidate_snapshots()
+        self.persister.mark_dirty(self._get_save_key(), self)
 
     @classmethod
     async def restore(cls) -> Self:
@@ -85,76 +177,122 @@ class Service(DictConvertible, ABC, Generic[StateModel, ConfigModel]):
 
     async def start(self) -> None:
         async with asyncio.TaskGroup() as tg:
+            self._mailbox_task = tg.create_task(self._drain_mailbox())
             tg.create_task(self._start())
-            tg.create_task(self._state_subscription())
-            tg.create_task(self._config_subscription())
+            tg.create_task(self._propose_subscription())
 
-    async def _config_subscription(self) -> None:
-        subscription = self.redis.subscription_iterator(Topic.PROPOSE_STATUS)
-        async for message in subscription:
-            key = self.state_type.to_key()
-            match message:
-                case RedisMessage(type=MessageType.STATE, data=config):
-                    if key == message.concerns:
-                        await self.update_state(config)
-                case RedisMessage(type=MessageType.INIT):
-                    if key == message.concerns:
-                        await self._broadcast_config()
-
-    async def _state_subscription(self) -> None:
-        subscription = self.redis.subscription_iterator(Topic.PROPOSE_STATUS)
+    async def _propose_subscription(self) -> None:
+        subscription = self.redis.subscription_iterator(
+            Topic.PROPOSE_STATUS,
+            types={MessageType.STATE, MessageType.CONFIG, MessageType.INIT},
+            concerns={self.state_type.to_key()},
+        )
         async for message in subscription:
-            key = self.state_type.to_key()
             match message:
-                case RedisMessage(type=MessageType.CONFIG, data=state):
-                    if key == message.concerns:
-                        await self.update_state(state)
+                case RedisMessage(type=MessageType.STATE, data=state):
+                    await self.update_state(self.state_type(**state))
+                case RedisMessage(type=MessageType.CONFIG, data=config):
+                    await self.update_config(self.config_type(**config))
                 case RedisMessage(type=MessageType.INIT):
-                    if key == message.concerns:
-                        await self._broadcast_state()
-
-    async def _broadcast_config(self) -> None:
-        await self._persist()
-        await self.redis.publish(
-            RedisMessage(
-                topic=Topic.BROADCAST_STATUS,
-                type=MessageType.CONFIG,
-                concerns=self.config_type.to_key(),
-                data=self.to_config(),
-            ),
+                    await self.broadcast_status()
+
+    def _config_message(self) -> RedisMessage:
+        return RedisMessage(
+            topic=Topic.BROADCAST_STATUS,
+            type=MessageType.CONFIG,
+            concerns=self.config_type.to_key(),
+            data=self.config_snapshot().dict,
         )
 
-    async def update_config(self, config: ConfigModel) -> None:
-        async with self.get_self_lock():
-            self._update_config(config)
-            await self._persist()
-            await self._broadcast_config()
-
-    async def _broadcast_state(self) -> None:
-        await self._persist()
-        await self.redis.publish(
-            RedisMessage(
+    @property
+    def state_version(self) -> int:
+        """Version of the last broadcasted state, increased each time a different state is broadcasted."""
+        return self._state_version
+
+    def _state_message(self, keyframe: bool = False) -> Optional[RedisMessage]:
+        """Returns the message broadcasting the current state, None if it did not change since the last one.
+
+        The message is a full `STATE` every `state_keyframe_interval` versions or when `keyframe` is set,
+        and a `STATE_DELTA` holding the JSON patch from the previous version otherwise.
+        """
+        state = self.state_snapshot().dict
+
+        patch = None if self._broadcasted_state is None else make_patch(self._broadcasted_state, state)
+        if patch is None or patch:
+            self._state_version += 1
+            self._broadcasted_state = state
+        elif not keyframe:
+            return None
+
+        if keyframe or not patch or self._state_version % settings.state_keyframe_interval == 0:
+            return RedisMessage(
                 topic=Topic.BROADCAST_STATUS,
                 type=MessageType.STATE,
                 concerns=self.state_type.to_key(),
-                data=self.to_state(),
-            ),
+                version=self._state_version,
+                data=state,
+            )
+
+        return RedisMessage(
+            topic=Topic.BROADCAST_STATUS,
+            type=MessageType.STATE_DELTA,
+            concerns=self.state_type.to_key(),
+            version=self._state_version,
+            data=patch,
         )
 
-    async def broadcast_status(self) -> None:
-        await self._broadcast_state()
+    async def _broadcast_config(self) -> None:
+        self._mark_changed()
+        await self.redis.publish(self._config_message())
+
+    async def update_config(self, config: ConfigModel) -> None:
+        await self.submit(self._apply_config, config)
+
+    async def _apply_config(self, config: ConfigModel) -> None:
+        self._update_config(config)
         await self._broadcast_config()
 
+    async def _broadcast_state(self, immediate: bool = False) -> None:
+        """Broadcasts the state, at the end of the broadcast window unless `immediate` is set."""
+        self._mark_changed()
+
+        if immediate or self.broadcast_window_seconds <= 0:
+            self._cancel_scheduled_broadcast()
+            await self._publish_state()
+        elif self._scheduled_broadcast is None or self._scheduled_broadcast.done():
+            self._scheduled_broadcast = asyncio.create_task(self._broadcast_after_window())
+
+    async def _publish_state(self) -> None:
+        message = self._state_message()
+        if message is not None:
+            await self.redis.publish(message)
+
+    async def _broadcast_after_window(self) -> None:
+        await asyncio.sleep(self.broadcast_window_seconds)
+        await self.submit(self._publish_state)
+
+    def _cancel_scheduled_broadcast(self) -> None:
+        if self._scheduled_broadcast is not None and not self._scheduled_broadcast.done():
+            self._scheduled_broadcast.cancel()
+
+    async def broadcast_status(self) -> None:
+        """Broadcasts the full state and config, e.g. for a newly connected client."""
+        self._cancel_scheduled_broadcast()
+        async with self.redis.batch() as batch:
+            batch.publish(self._state_message(keyframe=True))
+            batch.publish(self._config_message())
+
     async def update_state(self, state: StateModel) -> None:
-        async with self.get_self_lock():
-            self._update_state(state)
-            await self._persist()
-            await self._broadcast_state()
+        await self.submit(self._apply_state, state)
+
+    async def _apply_state(self, state: StateModel) -> None:
+        self._update_state(state)
+        await self._broadcast_state()
 
     def to_dict(self) -> Jsonable:
         return {
-            "state": self.to_state().model_dump(mode="json"),
-            "config": self.to_config().model_dump(mode="json"),
+            "state": self.state_snapshot().dict,
+            "config": self.config_snapshot().dict,
         }
 
     @classmethod
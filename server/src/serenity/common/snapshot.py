@@ -0,0 +1,42 @@
+import zlib
+from typing import Generic, Optional, TypeVar
+
+import orjson
+
+from serenity.common.definitions import Jsonable, ServiceType, StatusBaseModel
+
+T = TypeVar("T", bound=StatusBaseModel)
+
+
+def content_etag(key: ServiceType, data: Jsonable) -> str:
+    """Etag of a status, derived from its content only so it is the same in every process serving it."""
+    canonical = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)  # pylint: disable=maybe-no-member
+    return f'"{key.value}-{zlib.crc32(canonical):08x}"'
+
+
+class Snapshot(Generic[T]):
+    """A status model with its serialized forms, computed once on first use."""
+
+    def __init__(self, model: T) -> None:
+        self.model = model
+        self._dict: Optional[Jsonable] = None
+        self._json: Optional[bytes] = None
+        self._etag: Optional[str] = None
+
+    @property
+    def dict(self) -> Jsonable:
+        if self._dict is None:
+            self._dict = self.model.model_dump(mode="json")
+        return self._dict
+
+    @property
+    def json(self) -> bytes:
+        if self._json is None:
+            self._json = orjson.dumps(self.dict)  # pylint: disable=maybe-no-member
+        return self._json
+
+    @property
+    def etag(self) -> str:
+        if self._etag is None:
+            self._etag = content_etag(self.model.to_key(), self.dict)
+        return self._etag
@@ -0,0 +1,114 @@
+from typing import Dict, List, Optional, Tuple
+
+from serenity.common.definitions import Jsonable, MessageType, RedisMessage, ServiceType, Topic
+
+Patch = List[Dict[str, Jsonable]]
+
+
+def _escape(key: str) -> str:
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(key: str) -> str:
+    return key.replace("~1", "/").replace("~0", "~")
+
+
+def make_patch(old: Jsonable, new: Jsonable, path: str = "") -> Patch:
+    """Computes the JSON patch (RFC 6902 subset: add, remove, replace) turning `old` into `new`.
+
+    Dicts and lists of equal length are compared item by item, anything else is replaced as a whole.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        patch = [{"op": "remove", "path": f"{path}/{_escape(key)}"} for key in old.keys() - new.keys()]
+        for key, value in new.items():
+            if key in old:
+                patch.extend(make_patch(old[key], value, f"{path}/{_escape(key)}"))
+            else:
+                patch.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": value})
+        return patch
+
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        patch = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            patch.extend(make_patch(old_item, new_item, f"{path}/{index}"))
+        return patch
+
+    if type(old) is type(new) and old == new:
+        return []
+
+    return [{"op": "replace", "path": path, "value": new}]
+
+
+def apply_patch(document: Jsonable, patch: Patch) -> Jsonable:
+    """Applies a patch made by `make_patch` and returns the patched document.
+
+    The document is not modified: containers along the patched paths are copied, the rest is shared.
+    """
+    for operation in patch:
+        keys = [_unescape(key) for key in operation["path"].split("/")[1:]]
+        document = _apply_operation(document, keys, operation)
+    return document
+
+
+def _apply_operation(node: Jsonable, keys: List[str], operation: Dict[str, Jsonable]) -> Jsonable:
+    if not keys:
+        return operation.get("value")
+
+    key, rest = keys[0], keys[1:]
+    if isinstance(node, list):
+        key = int(key)
+        copy = list(node)
+    else:
+        copy = dict(node)
+
+    if rest:
+        copy[key] = _apply_operation(node[key], rest, operation)
+    elif operation["op"] == "remove":
+        del copy[key]
+    else:
+        copy[key] = operation["value"]
+    return copy
+
+
+def resync_request(concerns: ServiceType) -> RedisMessage:
+    """Asks a service to broadcast a full state, e.g. after a missed version."""
+    return RedisMessage(topic=Topic.PROPOSE_STATUS, type=MessageType.INIT, concerns=concerns)
+
+
+class MissedVersion(Exception):
+    """Raised when a delta does not follow the known state, the caller should publish a `resync_request`."""
+
+
+class StateMirror:
+    """Rebuilds the full states of services from their keyframes and deltas."""
+
+    def __init__(self) -> None:
+        self._states: Dict[ServiceType, Tuple[int, Jsonable]] = {}
+
+    def apply(self, message: RedisMessage) -> Optional[RedisMessage]:
+        """Returns the full state message after `message`, or None for a delta already applied.
+
+        Raises:
+            MissedVersion: If versions between the known state and the delta were missed.
+        """
+        match message:
+            case RedisMessage(type=MessageType.STATE):
+                self._states[message.concerns] = (message.version, message.data)
+                return message
+            case RedisMessage(type=MessageType.STATE_DELTA):
+                version, state = self._states.get(message.concerns, (None, None))
+                if version is not None and message.version <= version:
+                    return None
+                if version is None or message.version > version + 1:
+                    raise MissedVersion()
+
+                state = apply_patch(state, message.data)
+                self._states[message.concerns] = (message.version, state)
+                return RedisMessage(
+                    topic=message.topic,
+                    type=MessageType.STATE,
+                    concerns=message.concerns,
+                    version=message.version,
+                    data=state,
+                )
+        return message
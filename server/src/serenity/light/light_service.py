@@ -6,6 +6,7 @@ from serenity.common.definitions import MessageType, ServiceType, Topic
 from serenity.common.redis_client import RedisMessage
 
 from serenity.common.service import Service
+from serenity.common.versioning import MissedVersion, StateMirror, resync_request
 from serenity.light.definitions import Color, LightConfig, Light, LightState, Mode
 from aiomqtt import Client as MQTT, Message
 from serenity.sonar.definitions import Damage, SonarState
@@ -20,6 +21,10 @@ class LightService(Service[LightState, LightConfig]):
     def default_service(cls) -> LightService:
         return LightService(LightState(light=Light(color=Color.BLUE, mode=Mode.SET, secondary=None)), LightConfig())
 
+    def __init__(self, state: LightState, config: LightConfig) -> None:
+        self._sonar_mirror = StateMirror()
+        super().__init__(state, config)
+
     def _update_state(self, state: LightState) -> None:
         self._light = state.light
 
@@ -30,26 +35,37 @@ class LightService(Service[LightState, LightConfig]):
         pass
 
     def to_config(self) -> LightConfig:
-        pass
+        return LightConfig()
 
     async def _start(self) -> None:
         async with asyncio.TaskGroup() as tg:
             tg.create_task(self._status_subscription())
 
     async def _status_subscription(self) -> None:
-        subscription = self.redis.subscription_iterator(Topic.BROADCAST_STATUS)
+        subscription = self.redis.subscription_iterator(
+            Topic.BROADCAST_STATUS,
+            types={MessageType.STATE, MessageType.STATE_DELTA, MessageType.DAMAGE},
+        )
         async for message in subscription:
             try:
-                async with self.get_self_lock():
-                    match message:
-                        case RedisMessage(type=MessageType.STATE, concerns=ServiceType.SONAR, data=data):
-                            await self._deal_with_sonar(SonarState(**data))
-                        case RedisMessage(type=MessageType.DAMAGE, data=data):
-                            await self._deal_with_damage(Damage(**data))
-
+                await self.submit(self._on_status, message)
             except Exception as err:
                 logging.error("LIGHT: Error while processing command: %s\n%s", message, err)
 
+    async def _on_status(self, message: RedisMessage) -> None:
+        match message:
+            case RedisMessage(type=MessageType.STATE | MessageType.STATE_DELTA, concerns=ServiceType.SONAR):
+                try:
+                    state_message = self._sonar_mirror.apply(message)
+                except MissedVersion:
+                    await self.redis.publish(resync_request(ServiceType.SONAR))
+                    return
+                if state_message is None:
+                    return
+                await self._deal_with_sonar(SonarState(**state_message.data))
+            case RedisMessage(type=MessageType.DAMAGE, data=data):
+                await self._deal_with_damage(Damage(**data))
+
     async def _deal_with_sonar(self, state: SonarState) -> None:
         current_color = self._light.color
 
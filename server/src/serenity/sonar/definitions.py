@@ -71,7 +71,9 @@ class Mine(Launchable):
     uid: str = "__unset__"
 
     def __init__(self, **data) -> None:
-        data["uid"] = str(uuid.uuid4())
+        # Mines read back from a persisted map keep their uid
+        if data.get("uid", "__unset__") == "__unset__":
+            data["uid"] = str(uuid.uuid4())
         super().__init__(**data)
 
 
@@ -96,6 +98,8 @@ class MapModel(BaseModel):
     npc_ship: Ship
     ship_positions: Dict[Owner, GridPosition]
     mine_positions: Dict[str, GridPosition]
+    # Cells only serialize the type and owner of their content, the mines are kept whole here
+    mines: Dict[str, Mine] = {}
 
 
 class SonarState(StatusBaseModel):
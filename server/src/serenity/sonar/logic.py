@@ -1,12 +1,10 @@
-from copy import deepcopy
-from dataclasses import asdict, dataclass
-from enum import Enum, auto
-from hmac import new
-from typing import Dict, List, Optional, Self, Set, Tuple
+from functools import lru_cache
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+
 from serenity.common.definitions import Direction
-import math
 from serenity.sonar.definitions import (
-    Asteroid,
     CellModel,
     Damage,
     GameActor,
@@ -19,91 +17,28 @@ from serenity.sonar.definitions import (
     Torpedo,
     Trail,
 )
-from serenity.sonar.exceptions import CannotBeAddedToCell, ShipDestroyed
+from serenity.sonar.rules import can_occupy, occupiable
 
+# Layer of each owner in the trail array
+_OWNER_INDEX = {owner: index for index, owner in enumerate(Owner)}
 
-class Cell:
-    def __init__(self, cell: CellModel) -> None:
-        self._content = cell.content
-        self._has_asteroid = cell.has_asteroid
 
-    def to_model(self) -> CellModel:
-        return CellModel(
-            content=[actor for actor in self._content],
-            has_asteroid=self._has_asteroid,
-        )
+@lru_cache(maxsize=None)
+def _chebyshev_distances(radius: int) -> np.ndarray:
+    """Distances to the center of a square of side `2 * radius + 1`, shared by every blast of that radius."""
+    offsets = np.abs(np.arange(-radius, radius + 1))
+    distances = np.maximum.outer(offsets, offsets)
+    distances.flags.writeable = False
+    return distances
 
-    def _has_trail_for(self, owner: Owner) -> bool:
-        return any(isinstance(actor, Trail) and actor.owner == owner for actor in self._content)
-
-    def has_asteroid(self) -> bool:
-        return self._has_asteroid
-
-    def ship_for(self, owner: Owner) -> Optional[Ship]:
-        for actor in self._content:
-            if isinstance(actor, Ship) and actor.owner == owner:
-                return actor
-        return None
-
-    def find_mine(self, mine_uid: str) -> Optional[Mine]:
-        for actor in self._content:
-            if isinstance(actor, Mine) and actor.uid == mine_uid:
-                return actor
-        return None
-
-    def add(self, actor: GameActor):
-        if self._has_asteroid and not isinstance(actor, Torpedo):
-            raise CannotBeAddedToCell()
-
-        match actor:
-            case Asteroid():
-                self._has_asteroid = True
-            case Ship(owner=owner):
-                if self._has_trail_for(owner):
-                    raise CannotBeAddedToCell()
-                self._content.add(actor)
-            case Trail():
-                self._content.add(actor)
-            case Mine():
-                self._content.add(actor)
-            case Torpedo():
-                pass  # Do not raise
-            case _:
-                raise ValueError(f"Unknown actor type: {actor}")
-
-    def remove(self, actor: GameActor):
-        self._content.remove(actor)
-
-    def apply_damage(self, damage: int) -> List[Damage]:
-        inflicted = []
-        old_objects = []
-        new_objects = []
-        for actor in self._content:
-            try:
-                new_actor = actor.apply_damage(damage)
-                inflicted.append(Damage(amount=damage, owner=new_actor.owner))
-                old_objects.append(actor)
-                new_objects.append(new_actor)
-            except AttributeError:
-                pass
-
-        for old_actor in old_objects:
-            self._content.remove(old_actor)
-
-        for new_actor in new_objects:
-            self._content.add(new_actor)
 
-        return inflicted
-
-
-@dataclass(frozen=True)
-class CellDistance:
-    cell: Cell
-    distance: int
-    position: GridPosition
+class Map:
+    """Sonar battle map.
 
+    Asteroids and trails are boolean arrays indexed by cell, ships and mines are kept by owner and
+    uid with their positions. Cells, as sent to the dashboards, only exist in `to_model`.
+    """
 
-class Map:
     def __init__(
         self,
         map: MapModel,
@@ -111,56 +46,67 @@ class Map:
         self.width = map.width
         self.height = map.height
 
-        self._grid = [[Cell(cell) for cell in row] for row in map.grid]
+        self._asteroids = np.array([[cell.has_asteroid for cell in row] for row in map.grid], dtype=bool)
+        self._trails = np.zeros((len(_OWNER_INDEX), self.height, self.width), dtype=bool)
+        self._mines: Dict[str, Mine] = dict(map.mines)
 
-        self._mine_positions: Dict[str, GridPosition] = {}
+        for y, row in enumerate(map.grid):
+            for x, cell in enumerate(row):
+                for actor in cell.content:
+                    if actor.type == "trail" and actor.owner is not None:
+                        self._trails[_OWNER_INDEX[actor.owner], y, x] = True
 
-        self._ship_positions = map.ship_positions
+        self._mine_positions: Dict[str, GridPosition] = {
+            uid: position for uid, position in map.mine_positions.items() if uid in self._mines
+        }
 
-        for owner, ship in [(Owner.PLAYERS, map.player_ship), (Owner.NPCS, map.npc_ship)]:
-            ship_position = self._ship_positions[owner]
-            self._grid[ship_position.y][ship_position.x].add(ship)
+        self._ships = {Owner.PLAYERS: map.player_ship, Owner.NPCS: map.npc_ship}
+        self._ship_positions = dict(map.ship_positions)
 
     def to_model(self) -> MapModel:
+        contents: Dict[Tuple[int, int], Set[GameActor]] = {}
+
+        for owner, index in _OWNER_INDEX.items():
+            for y, x in np.argwhere(self._trails[index]):
+                contents.setdefault((int(y), int(x)), set()).add(Trail(owner=owner))
+        for owner, position in self._ship_positions.items():
+            contents.setdefault((position.y, position.x), set()).add(self._ships[owner])
+        for uid, position in self._mine_positions.items():
+            contents.setdefault((position.y, position.x), set()).add(self._mines[uid])
+
+        # The cells are built from consistent data, validating them again would dominate the serialization
+        grid = [
+            [
+                CellModel.model_construct(content=contents.get((y, x), set()), has_asteroid=bool(self._asteroids[y, x]))
+                for x in range(self.width)
+            ]
+            for y in range(self.height)
+        ]
+
         return MapModel(
             width=self.width,
             height=self.height,
-            grid=[[cell.to_model() for cell in row] for row in self._grid],
+            grid=grid,
             player_ship=self.ship_for(Owner.PLAYERS),
             npc_ship=self.ship_for(Owner.NPCS),
             ship_positions=self._ship_positions,
             mine_positions=self._mine_positions,
+            mines=self._mines,
         )
 
     def get_asteroid_positions(self) -> List[GridPosition]:
-        # search asteroid positions
-        asteroid_positions = []
-        for y in range(self.height):
-            for x in range(self.width):
-                if isinstance(self._grid[y][x], Asteroid):
-                    asteroid_positions.append(GridPosition(x, y))
-        return asteroid_positions
+        return [GridPosition(int(x), int(y)) for y, x in np.argwhere(self._asteroids)]
 
     def ship_for(self, owner: Owner) -> Ship:
-        ship_position = self._ship_positions[owner]
-        ship_cell = self._grid[ship_position.y][ship_position.x]
-        return ship_cell.ship_for(owner)
+        return self._ships[owner]
 
     def move_ship(self, owner: Owner, move_direction: Direction) -> None:
         if move_direction not in self.available_moves_for_ship(owner):
             raise ValueError(f"Invalid move direction: {move_direction}")
 
         ship_position = self._ship_positions[owner]
-        current_cell = self._grid[ship_position.y][ship_position.x]
-        ship = current_cell.ship_for(owner)
-
-        current_cell.remove(ship)
-        current_cell.add(Trail(owner=owner))
-
-        new_pos = self._position_at(ship_position, move_direction)
-
-        self._grid[new_pos.y][new_pos.x].add(ship)
-        self._ship_positions[owner] = new_pos
+        self._trails[_OWNER_INDEX[owner], ship_position.y, ship_position.x] = True
+        self._ship_positions[owner] = self._position_at(ship_position, move_direction)
 
     def _position_at(self, position: GridPosition, direction: Direction) -> GridPosition:
         match direction:
@@ -173,53 +119,45 @@ class Map:
             case Direction.West:
                 return GridPosition(position.x - 1, position.y)
 
+    def _in_bounds(self, position: GridPosition) -> bool:
+        return 0 <= position.x < self.width and 0 <= position.y < self.height
+
     def remove_hp(self, owner: Owner, hp: int) -> None:
-        cell = self._grid[self._ship_positions[owner].y][self._ship_positions[owner].x]
-        cell.apply_damage(hp)
+        self._damage_ships_at(self._ship_positions[owner], hp)
 
     def available_moves_for_ship(self, owner: Owner) -> List[Direction]:
         ship_position = self._ship_positions[owner]
-        current_cell = self._grid[ship_position.y][ship_position.x]
-        ship = current_cell.ship_for(owner)
-
-        surrounding_cells = {}
-
-        if ship_position.y > 0:
-            surrounding_cells[Direction.North] = self._grid[ship_position.y - 1][ship_position.x]
-        if ship_position.y < self.height - 1:
-            surrounding_cells[Direction.South] = self._grid[ship_position.y + 1][ship_position.x]
-        if ship_position.x > 0:
-            surrounding_cells[Direction.West] = self._grid[ship_position.y][ship_position.x - 1]
-        if ship_position.x < self.width - 1:
-            surrounding_cells[Direction.East] = self._grid[ship_position.y][ship_position.x + 1]
+        ship = self._ships[owner]
 
         available_moves = []
-
-        for direction, cell in surrounding_cells.items():
-            if self._can_be_added_to_cell(ship, cell):
+        for direction in (Direction.North, Direction.South, Direction.West, Direction.East):
+            position = self._position_at(ship_position, direction)
+            if self._in_bounds(position) and self._can_be_added_to_cell(ship, position):
                 available_moves.append(direction)
 
         return available_moves
 
-    def _can_be_added_to_cell(self, actor: GameActor, cell: Cell) -> bool:
-        try:
-            test_cell = deepcopy(cell)
-            test_cell.add(actor)
-            return True
-        except CannotBeAddedToCell:
-            return False
+    def _can_be_added_to_cell(self, actor: GameActor, position: GridPosition) -> bool:
+        return can_occupy(
+            actor,
+            has_asteroid=bool(self._asteroids[position.y, position.x]),
+            has_own_trail=bool(self._trails[_OWNER_INDEX[actor.owner], position.y, position.x]),
+        )
 
     def possible_object_launch(self, launchable: Launchable) -> Set[GridPosition]:
         ship_position = self._ship_positions[launchable.owner]
+        reach = launchable.reach
+
+        # Every cell of the clipped square is within reach
+        top, left = max(ship_position.y - reach, 0), max(ship_position.x - reach, 0)
+        bottom, right = ship_position.y + reach + 1, ship_position.x + reach + 1
+        mask = occupiable(
+            launchable,
+            self._asteroids[top:bottom, left:right],
+            self._trails[_OWNER_INDEX[launchable.owner], top:bottom, left:right],
+        )
 
-        in_radius = self._cells_in_radius(ship_position, launchable.reach)
-
-        possible_positions = set()
-        for cell_distance in in_radius:
-            if self._can_be_added_to_cell(launchable, cell_distance.cell):
-                possible_positions.add(cell_distance.position)
-
-        return possible_positions
+        return {GridPosition(int(x) + left, int(y) + top) for y, x in np.argwhere(mask)}
 
     def launch_torpedo(self, torpedo: Torpedo, target: GridPosition) -> List[Damage]:
         if target not in self.possible_object_launch(torpedo):
@@ -230,54 +168,45 @@ class Map:
     def place_mine(self, mine: Mine, position: GridPosition) -> None:
         if position not in self.possible_object_launch(mine):
             raise ValueError(f"Invalid mine placement: {position}")
-        self._grid[position.y][position.x].add(mine)
+        self._mines[mine.uid] = mine
         self._mine_positions[mine.uid] = position
 
     def _find_mine(self, mine_uid: str) -> Tuple[Mine, GridPosition]:
-        for mine_uid, position in self._mine_positions.items():
-            mine = self._grid[position.y][position.x].find_mine(mine_uid)
-            if mine is not None:
-                return mine, position
-        raise ValueError(f"Mine {mine_uid} not found")
+        if mine_uid not in self._mines:
+            raise ValueError(f"Mine {mine_uid} not found")
+        return self._mines[mine_uid], self._mine_positions[mine_uid]
+
+    def _damage_ships_at(self, position: GridPosition, damage: int) -> List[Damage]:
+        """Damages every ship in a cell, a negative damage repairs them."""
+        inflicted = []
+        for owner, ship_position in self._ship_positions.items():
+            if ship_position == position:
+                self._ships[owner] = self._ships[owner].apply_damage(damage)
+                inflicted.append(Damage(amount=damage, owner=owner))
+        return inflicted
 
     def _apply_damage_with_falloff(self, launchable: Launchable, target: GridPosition) -> List[Damage]:
-        damaged_cells = self._cells_in_radius(target, launchable.radius)
+        """Damages all the ships within the blast radius at once, less the further they are from the target."""
+        distances = _chebyshev_distances(launchable.radius)
+        owners = list(self._ship_positions)
+        positions = np.array([(position.y, position.x) for position in self._ship_positions.values()])
 
+        offsets = positions - (target.y, target.x) + launchable.radius
+        hit = np.all((offsets >= 0) & (offsets < distances.shape[0]), axis=1)
+        damages = launchable.damage - distances[offsets[hit, 0], offsets[hit, 1]]
+        hit_owners = [owner for owner, is_hit in zip(owners, hit) if is_hit]
+
+        # Ships are damaged from the top left of the blast, which decides the destroyed ship if both would be
         inflicted_damages = []
-        for cell_distance in damaged_cells:
-            damage = launchable.damage - cell_distance.distance
-            print(cell_distance.cell._content, cell_distance.distance)
-            inflicted = cell_distance.cell.apply_damage(damage)
-            inflicted_damages.extend(inflicted)
+        for index in np.lexsort((positions[hit, 1], positions[hit, 0])):
+            owner, damage = hit_owners[index], int(damages[index])
+            self._ships[owner] = self._ships[owner].apply_damage(damage)
+            inflicted_damages.append(Damage(amount=damage, owner=owner))
         return inflicted_damages
 
     def detonate_mine(self, mine_uid: str) -> List[Damage]:
         mine, mine_position = self._find_mine(mine_uid)
         inflicted = self._apply_damage_with_falloff(mine, mine_position)
-        self._grid[mine_position.y][mine_position.x].remove(mine)
+        del self._mines[mine_uid]
         del self._mine_positions[mine_uid]
         return inflicted
-
-    def _grid_distance(self, a: GridPosition, b: GridPosition) -> int:
-        dx = abs(a.x - b.x)
-        dy = abs(a.y - b.y)
-
-        return max(dx, dy)
-
-    def _cells_in_radius(self, position: GridPosition, reach: int) -> List[CellDistance]:
-        cell_distances = []
-        for y in range(position.y - reach, position.y + reach + 1):
-            for x in range(position.x - reach, position.x + reach + 1):
-                if x < 0 or x >= self.width or y < 0 or y >= self.height:
-                    continue
-
-                target = GridPosition(x, y)
-                distance = self._grid_distance(position, target)
-
-                if distance > reach:
-                    continue
-
-                cell = self._grid[y][x]
-                cell_distances.append(CellDistance(cell, distance, target))
-
-        return cell_distances
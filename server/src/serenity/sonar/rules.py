@@ -0,0 +1,34 @@
+import numpy as np
+
+from serenity.sonar.definitions import GameActor, Ship, Torpedo
+
+
+def can_occupy(actor: GameActor, has_asteroid: bool, has_own_trail: bool) -> bool:
+    """Whether an actor can be placed in a cell.
+
+    Only torpedoes reach asteroid cells, and a ship cannot cross its own trail.
+
+    Args:
+        actor: The actor to place, only its type matters.
+        has_asteroid: Whether the cell holds an asteroid.
+        has_own_trail: Whether the cell holds a trail of the actor's owner.
+    """
+    if has_asteroid:
+        return isinstance(actor, Torpedo)
+
+    if isinstance(actor, Ship):
+        return not has_own_trail
+
+    return True
+
+
+def occupiable(actor: GameActor, asteroids: np.ndarray, own_trails: np.ndarray) -> np.ndarray:
+    """Boolean mask of the cells an actor can be placed in, `can_occupy` applied to whole arrays."""
+    if isinstance(actor, Torpedo):
+        return np.ones(asteroids.shape, dtype=bool)
+
+    mask = ~asteroids
+    if isinstance(actor, Ship):
+        mask &= ~own_trails
+
+    return mask
@@ -11,6 +11,7 @@ import orjson
 
 from redis.asyncio import StrictRedis
 from serenity.common.definitions import MessageType, Owner, Topic
+from serenity.common.metrics import handler_seconds
 
 
 from serenity.common.redis_client import RedisMessage
@@ -26,6 +27,18 @@ from serenity.common.config import settings
 class SonarService(Service[SonarState, SonarConfig]):
     state_type = SonarState
     config_type = SonarConfig
+    broadcast_window_seconds = settings.sonar_broadcast_window_seconds
+
+    handled_commands = {
+        MessageType.START_BATTLE,
+        MessageType.END_BATTLE,
+        MessageType.MOVE,
+        MessageType.LAUNCH_TORPEDO,
+        MessageType.LAUNCH_MINE,
+        MessageType.DETONATE_MINE,
+        MessageType.REPAIR,
+        MessageType.DIRECT_DAMAGE,
+    }
 
     @classmethod
     def default_service(cls) -> SonarService:
@@ -45,6 +58,10 @@ class SonarService(Service[SonarState, SonarConfig]):
         )
         return cls(default_state, default_config)
 
+    def __init__(self, state: SonarState, config: SonarConfig) -> None:
+        self._pending_damages: List[Damage] = []
+        super().__init__(state, config)
+
     def _update_state(self, state: SonarState) -> None:
         self._in_battle = state.in_battle
         if state.map is not None:
@@ -71,50 +88,76 @@ class SonarService(Service[SonarState, SonarConfig]):
             tg.create_task(self._command_subscription())
 
     async def _command_subscription(self) -> None:
-        subscription = self.redis.subscription_iterator(Topic.COMMAND)
+        subscription = self.redis.subscription_iterator(Topic.COMMAND, types=self.handled_commands)
         async for message in subscription:
-            try:
-                if not self._in_battle:
-                    match message:
-                        case RedisMessage(type=MessageType.START_BATTLE, data=data):
-                            await self.execute(self.start_battle, data["map"], Ship(**data["ship"]))
-                        case _:
-                            raise ValueError(f"Not in battle, cannot resolve: {message}.")
-                else:
-                    match message:
-                        case RedisMessage(type=MessageType.END_BATTLE):
-                            await self.execute(self.end_battle)
-                        case RedisMessage(type=MessageType.MOVE, data=data):
-                            await self.execute(self.move, Owner(data["owner"]), Direction(data["direction"]))
-                        case RedisMessage(type=MessageType.LAUNCH_TORPEDO, data=data):
-                            await self.execute(
-                                self.launch_torpedo, Owner(data["owner"]), GridPosition(**data["target"])
-                            )
-                        case RedisMessage(type=MessageType.LAUNCH_MINE, data=data):
-                            await self.execute(self.place_mine, Owner(data["owner"]), GridPosition(**data["target"]))
-                        case RedisMessage(type=MessageType.DETONATE_MINE, data=data):
-                            await self.execute(self.detonate_mine, data["mine_uid"])
-                        case RedisMessage(type=MessageType.REPAIR, data=data):
-                            await self.execute(self.repair, Owner(data["owner"]), data["hp"])
-                        case RedisMessage(type=MessageType.START_BATTLE):
-                            raise ValueError("Can only start battle if not in battle.")
-                        case RedisMessage(type=MessageType.DIRECT_DAMAGE, data=data):
-                            await self.execute(self._direct_damage, Damage(**data))
-                        case _:
-                            raise ValueError(f"Unknown message type: {message.type}.")
-            except Exception as err:
-                logging.error("SONAR: Error while processing command: %s\n%s", message, err)
+            with handler_seconds.time(handler="sonar_command"):
+                await self._handle_command(message)
+
+    async def _handle_command(self, message: RedisMessage) -> None:
+        try:
+            if not self._in_battle:
+                match message:
+                    case RedisMessage(type=MessageType.START_BATTLE, data=data):
+                        await self.execute(self.start_battle, data["map"], Ship(**data["ship"]))
+                    case _:
+                        raise ValueError(f"Not in battle, cannot resolve: {message}.")
+            else:
+                match message:
+                    case RedisMessage(type=MessageType.END_BATTLE):
+                        await self.execute(self.end_battle)
+                    case RedisMessage(type=MessageType.MOVE, data=data):
+                        await self.execute(self.move, Owner(data["owner"]), Direction(data["direction"]))
+                    case RedisMessage(type=MessageType.LAUNCH_TORPEDO, data=data):
+                        await self.execute(self.launch_torpedo, Owner(data["owner"]), GridPosition(**data["target"]))
+                    case RedisMessage(type=MessageType.LAUNCH_MINE, data=data):
+                        await self.execute(self.place_mine, Owner(data["owner"]), GridPosition(**data["target"]))
+                    case RedisMessage(type=MessageType.DETONATE_MINE, data=data):
+                        await self.execute(self.detonate_mine, data["mine_uid"])
+                    case RedisMessage(type=MessageType.REPAIR, data=data):
+                        await self.execute(self.repair, Owner(data["owner"]), data["hp"])
+                    case RedisMessage(type=MessageType.START_BATTLE):
+                        raise ValueError("Can only start battle if not in battle.")
+                    case RedisMessage(type=MessageType.DIRECT_DAMAGE, data=data):
+                        await self.execute(self._direct_damage, Damage(**data))
+                    case _:
+                        raise ValueError(f"Unknown message type: {message.type}.")
+        except Exception as err:
+            logging.error("SONAR: Error while processing command: %s\n%s", message, err)
 
     async def execute(self, action: Callable, *args, **kwargs) -> None:
-        """Exectutes an action with lock and brodcasts the state afterwards."""
-        async with self.redis.get_lock(__file__):
-            try:
-                await action(*args, **kwargs)
-            except ShipDestroyed as err:
-                logging.info("SONAR: Ship %s destroyed, ending battle.", err.ship.name)
-                await self.end_battle()
+        """Exectutes an action in the service mailbox and brodcasts the state afterwards."""
+        await self.submit(self._execute, action, *args, **kwargs)
+
+    async def _execute(self, action: Callable, *args, **kwargs) -> None:
+        """Damages inflicted by the action are published right away.
+
+        The state is broadcasted at the end of the broadcast window, except for battle start and end
+        which are broadcasted immediately, together with the damages in a single batch.
+        """
+        immediate = action in (self.start_battle, self.end_battle)
+        try:
+            await action(*args, **kwargs)
+        except ShipDestroyed as err:
+            logging.info("SONAR: Ship %s destroyed, ending battle.", err.ship.name)
+            await self.end_battle()
+            immediate = True
+
+        damages, self._pending_damages = self._pending_damages, []
+
+        state_message = None
+        if immediate or self.broadcast_window_seconds <= 0:
+            self._mark_changed()
+            self._cancel_scheduled_broadcast()
+            state_message = self._state_message()
+        else:
             await self._broadcast_state()
 
+        async with self.redis.batch() as batch:
+            for damage in damages:
+                batch.publish(self._damage_message(damage))
+            if state_message is not None:
+                batch.publish(state_message)
+
     def _get_asteroid_positions(self, map_file_name: str) -> List[GridPosition]:
         with open(settings.asteroid_map_dir / f"{map_file_name}.json", encoding="utf-8") as file:
             map_data = orjson.loads(file.read())  # type: ignore
@@ -183,18 +226,15 @@ class SonarService(Service[SonarState, SonarConfig]):
             reach=self._config.torpedo_reach,
             radius=self._config.torpedo_radius,
         )
-        damages = self._map.launch_torpedo(torpedo, target)
-        await self._broadcast_damages(damages)
-
-    async def _broadcast_damages(self, damages: List[Damage]) -> None:
-        for damage in damages:
-            await self.redis.publish(
-                RedisMessage(
-                    topic=Topic.BROADCAST_STATUS,
-                    type=MessageType.DAMAGE,
-                    data=damage,
-                )
-            )
+        self._pending_damages.extend(self._map.launch_torpedo(torpedo, target))
+
+    @staticmethod
+    def _damage_message(damage: Damage) -> RedisMessage:
+        return RedisMessage(
+            topic=Topic.BROADCAST_STATUS,
+            type=MessageType.DAMAGE,
+            data=damage,
+        )
 
     async def place_mine(self, owner: Owner, target: GridPosition) -> None:
         mine = Mine(
@@ -206,8 +246,7 @@ class SonarService(Service[SonarState, SonarConfig]):
         self._map.place_mine(mine, target)
 
     async def detonate_mine(self, mine_uid: str) -> None:
-        damages = self._map.detonate_mine(mine_uid)
-        await self._broadcast_damages(damages)
+        self._pending_damages.extend(self._map.detonate_mine(mine_uid))
 
     async def repair(self, owner: Owner, hp: int) -> None:
         self._map.remove_hp(owner, -hp)
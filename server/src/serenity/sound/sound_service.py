@@ -46,29 +46,31 @@ class SoundService(Service[SoundState, SoundConfig]):
             tg.create_task(self._command_subscription())
 
     async def _command_subscription(self) -> None:
-        subscription = self.redis.subscription_iterator(Topic.COMMAND)
+        subscription = self.redis.subscription_iterator(Topic.COMMAND, types={MessageType.START_BATTLE})
         async for message in subscription:
             try:
-                async with self.get_self_lock():
-                    match message:
-                        case RedisMessage(type=MessageType.START_BATTLE):
-                            await self._start_battle()
-
+                await self.submit(self._on_command, message)
             except Exception as err:
                 logging.error("SOUND: Error while processing command: %s\n%s", message, err)
 
+    async def _on_command(self, message: RedisMessage) -> None:
+        match message:
+            case RedisMessage(type=MessageType.START_BATTLE):
+                await self._start_battle()
+
     async def _status_subscription(self) -> None:
-        subscription = self.redis.subscription_iterator(Topic.BROADCAST_STATUS)
+        subscription = self.redis.subscription_iterator(Topic.BROADCAST_STATUS, types={MessageType.DAMAGE})
         async for message in subscription:
             try:
-                async with self.get_self_lock():
-                    match message:
-                        case RedisMessage(type=MessageType.DAMAGE):
-                            self.play_damage()
-
+                await self.submit(self._on_status, message)
             except Exception as err:
                 logging.error("SOUND: Error while processing command: %s\n%s", message, err)
 
+    async def _on_status(self, message: RedisMessage) -> None:
+        match message:
+            case RedisMessage(type=MessageType.DAMAGE):
+                self.play_damage()
+
 
 
     async def start_background(self, sound: str) -> None:
@@ -7,6 +7,7 @@ import asyncio
 
 
 from serenity.common.definitions import MessageType, Owner, ServiceType, Topic
+from serenity.common.metrics import handler_seconds
 from serenity.common.redis_client import RedisClient, RedisMessage
 from serenity.common.service import Service
 from serenity.sonar.definitions import Damage
@@ -55,19 +56,23 @@ class SwitchService(Service[SwitchState, SwitchConfig]):
             tg.create_task(self._start_mqtt())
 
     async def _command_subscription(self) -> None:
-        subscription = self.redis.subscription_iterator(Topic.COMMAND)
+        subscription = self.redis.subscription_iterator(
+            Topic.COMMAND,
+            types={MessageType.SURFACE, MessageType.START_BATTLE},
+        )
         async for message in subscription:
             try:
-                async with self.get_self_lock():
-                    match message:
-                        case RedisMessage(type=MessageType.SURFACE):
-                            await self._reset_switches()
-                        case RedisMessage(type=MessageType.START_BATTLE):
-                            await self._reset_switches()
-
+                await self.submit(self._on_command, message)
             except Exception as err:
                 logging.error("SWITCH: Error while processing command: %s\n%s", message, err)
 
+    async def _on_command(self, message: RedisMessage) -> None:
+        match message:
+            case RedisMessage(type=MessageType.SURFACE):
+                await self._reset_switches()
+            case RedisMessage(type=MessageType.START_BATTLE):
+                await self._reset_switches()
+
     async def _start_mqtt(self) -> None:
         async with MQTT("localhost") as client:
             async with client.messages() as messages:
@@ -75,7 +80,8 @@ class SwitchService(Service[SwitchState, SwitchConfig]):
                 logging.info("Starting mqqtt for switches")
                 async for message in messages:
                     try:
-                        await self._on_mqtt_message(message)
+                        with handler_seconds.time(handler="switch_mqtt"):
+                            await self.submit(self._on_mqtt_message, message)
                     except Exception as err:
                         logging.error("Error in mqtt message: %s", err)
 
@@ -91,6 +97,7 @@ class SwitchService(Service[SwitchState, SwitchConfig]):
 
             assert switch in self._switches, f"missing switch in config {switch}"
             await self._deal_with_switch(switch)
+            self._mark_changed()
 
         await self._publish_mqtt_state()
 
@@ -123,7 +130,7 @@ class SwitchService(Service[SwitchState, SwitchConfig]):
     async def _reset_switches(self):
         for switch in self._switches:
             self._switches[switch] = True
-
+        self._mark_changed()
 
         await self._publish_mqtt_state()
 
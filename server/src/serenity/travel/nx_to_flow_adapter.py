@@ -1,8 +1,10 @@
 import logging
 import stat
+from collections import OrderedDict
 
-from typing import List, Tuple
+from typing import Hashable, List, Tuple
 from serenity.common.adapter import Adapter
+from serenity.common.config import settings
 from serenity.common.definitions import Jsonable
 from serenity.common.redis_client import RedisMessage
 import networkx as nx
@@ -13,18 +15,41 @@ from serenity.travel.planet_graph import PlanetGraph
 class NxToFlowAdapter(Adapter[TravelState]):
     status_model = TravelState
 
+    # Graph derived fields by (planetary config, current step), least recently used first
+    _cache: OrderedDict[Hashable, dict] = OrderedDict()
+
     @classmethod
     def _adapt(cls, model: TravelState) -> Jsonable:
-        graph = PlanetGraph(model.planetary_config)
-        flow_graph = cls._node_link_to_flow(graph, model.current_step_id)
-
         output = model.model_dump(exclude={"planetary_config"}, mode="json")
-        output["flow_graph"] = flow_graph
-        output["num_steps"] = nx.dag_longest_path_length(graph) + 1
+        output.update(cls._graph_fields(model))
+        return output
+
+    @classmethod
+    def _graph_fields(cls, model: TravelState) -> dict:
+        """Fields computed from the planet graph, which only change when the ship lands or leaves.
 
-        output["total_duration_minutes"] = cls._compute_total_duration_minutes(model.planetary_config, model.current_step_id)
+        The visited flags are part of the planetary config, so they are covered by the key.
+        """
+        key = (model.planetary_config.model_dump_json(), model.current_step_id)
 
-        return output
+        if key in cls._cache:
+            cls._cache.move_to_end(key)
+            return cls._cache[key]
+
+        graph = PlanetGraph(model.planetary_config)
+        fields = {
+            "flow_graph": cls._node_link_to_flow(graph, model.current_step_id),
+            "num_steps": nx.dag_longest_path_length(graph) + 1,
+            "total_duration_minutes": cls._compute_total_duration_minutes(
+                model.planetary_config, model.current_step_id
+            ),
+        }
+
+        cls._cache[key] = fields
+        if len(cls._cache) > settings.travel_adapter_cache_size:
+            cls._cache.popitem(last=False)
+
+        return fields
 
     @classmethod
     def _compute_total_duration_minutes(cls, planetary_config: PlanetaryConfig, current_id: str | Tuple[str, str]) -> float:
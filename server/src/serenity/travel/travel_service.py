@@ -5,7 +5,7 @@ from math import log
 import random
 from datetime import datetime, timedelta
 
-from typing import Self
+from typing import Optional, Self
 
 
 from serenity.common.config import settings
@@ -14,6 +14,7 @@ from serenity.common.definitions import (
     Topic,
 )
 
+from serenity.common.metrics import handler_seconds
 from serenity.common.redis_client import RedisMessage
 from serenity.common.service import Service
 from serenity.travel.definitions import ShipState, TravelConfig, TravelState
@@ -78,23 +79,36 @@ class TravelService(Service[TravelState, TravelConfig]):
             tg.create_task(self._run_tick_loop())
 
     async def _command_subscription(self) -> None:
-        subscription = self.redis.subscription_iterator(Topic.COMMAND)
+        subscription = self.redis.subscription_iterator(
+            Topic.COMMAND,
+            types={
+                MessageType.TAKEOFF,
+                MessageType.PAUSE_TRAVEL,
+                MessageType.RESUME_TRAVEL,
+                MessageType.START_BATTLE,
+                MessageType.END_BATTLE,
+            },
+        )
         async for message in subscription:
-            try:
-                match message:
-                    case RedisMessage(type=MessageType.TAKEOFF, data=target_id):
-                        try:
-                            await self.takeoff(target_id)
-                        except CannotTakeOffException as e:
-                            logging.error("TRAVEL: Cannot take off: %s", e)
-                    case RedisMessage(type=MessageType.START_BATTLE):
-                        await self.pause()
-                    case RedisMessage(type=MessageType.END_BATTLE):
-                        await self.resume()
-            except Exception as err:
-                logging.error("TRAVEL: Error while handling command: %s", err)
+            with handler_seconds.time(handler="travel_command"):
+                try:
+                    match message:
+                        case RedisMessage(type=MessageType.TAKEOFF, data=target_id):
+                            try:
+                                await self.takeoff(target_id)
+                            except CannotTakeOffException as e:
+                                logging.error("TRAVEL: Cannot take off: %s", e)
+                        case RedisMessage(type=MessageType.PAUSE_TRAVEL | MessageType.START_BATTLE):
+                            await self.pause()
+                        case RedisMessage(type=MessageType.RESUME_TRAVEL | MessageType.END_BATTLE):
+                            await self.resume()
+                except Exception as err:
+                    logging.error("TRAVEL: Error while handling command: %s", err)
 
     async def takeoff(self, target_id: str) -> None:
+        await self.submit(self._checked_takeoff, target_id)
+
+    async def _checked_takeoff(self, target_id: str) -> None:
         if self._ship_state != ShipState.Landed:
             raise CannotTakeOffException("Cannot take off when not landed, maybe paused?")
 
@@ -108,8 +122,7 @@ class TravelService(Service[TravelState, TravelConfig]):
         if self._step_elapsed_minutes() < self._step_min_minutes():
             raise CannotTakeOffException("Cannot take off before minimum stop time")
 
-        async with self.get_self_lock():
-            await self._takeoff(target_id)
+        await self._takeoff(target_id)
 
     def _set_state(self, state: ShipState) -> None:
         self._ship_state = state
@@ -117,8 +130,7 @@ class TravelService(Service[TravelState, TravelConfig]):
     async def _run_tick_loop(self) -> None:
         while True:
             try:
-                async with self.get_self_lock():
-                    await self._tick()
+                await self.submit(self._tick)
                 await asyncio.sleep(self._travel_tick_seconds)
             except asyncio.CancelledError as err:
                 raise err
@@ -126,29 +138,36 @@ class TravelService(Service[TravelState, TravelConfig]):
                 logging.error("TRAVEL: Error while ticking: %s", err)
 
     async def pause(self) -> None:
+        await self.submit(self._pause)
+
+    async def _pause(self) -> None:
         if self._ship_state == ShipState.Paused:
             return
-        async with self.get_self_lock():
-            self._set_state(ShipState.Paused)
-            self._pause_start = datetime.utcnow()
-            await self._broadcast_state()
+        self._set_state(ShipState.Paused)
+        self._pause_start = datetime.utcnow()
+        await self._broadcast_state()
 
     async def resume(self) -> None:
+        await self.submit(self._resume)
+
+    async def _resume(self) -> None:
         if self._ship_state != ShipState.Paused:
             return
-        async with self.get_self_lock():
-            # Create a fake start time assuming pause didn't happen
-            self._step_start = datetime.utcnow() - self._pause_duration()
-            self._set_state(self._infer_state_from_current_step_id())
-            await self._broadcast_state()
+        # Create a fake start time assuming pause didn't happen
+        self._step_start = datetime.utcnow() - self._pause_duration()
+        self._set_state(self._infer_state_from_current_step_id())
+        await self._broadcast_state()
 
     async def _tick(self) -> None:
         match self._ship_state:
             case ShipState.Paused:
                 pass
             case ShipState.Landed:
+                # The elapsed step duration is part of the state, snapshots are refreshed at the tick resolution
+                self._invalidate_snapshots()
                 await self._update_landed()
             case ShipState.Traveling:
+                self._invalidate_snapshots()
                 await self._update_travel()
 
     def _infer_state_from_current_step_id(self) -> ShipState:
@@ -160,14 +179,16 @@ class TravelService(Service[TravelState, TravelConfig]):
             raise ValueError(f"Invalid current step id {self._current_step_id}")
 
     def _step_elapsed_minutes(self) -> float:
-        time_from_start = datetime.utcnow() - self._step_start
-        pause_duration = self._pause_duration()
+        # A single now keeps the elapsed time constant while paused
+        now = datetime.utcnow()
+        time_from_start = now - self._step_start
+        pause_duration = self._pause_duration(now)
         return (time_from_start - pause_duration).total_seconds() / 60.0
 
-    def _pause_duration(self) -> timedelta:
+    def _pause_duration(self, now: Optional[datetime] = None) -> timedelta:
         if self._ship_state != ShipState.Paused:
             return timedelta()
-        return datetime.utcnow() - self._pause_start
+        return (now or datetime.utcnow()) - self._pause_start
 
     async def _update_landed(self) -> None:
         if self._step_elapsed_minutes() >= self._step_max_minutes():